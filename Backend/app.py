@@ -1,33 +1,184 @@
-from flask import Flask, render_template, request
+from flask import Blueprint, Flask, Response, current_app, render_template, request, stream_with_context
 import os
 from werkzeug.utils import secure_filename
-from PyPDF2 import PdfReader
-from google import genai
+from pdf_ingest import spool_upload, extract_pdf_text
 from dotenv import load_dotenv
 import json
-load_dotenv()  # Load environment variables from .env file
+import io
+import hashlib
+import random
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+load_dotenv()  # Load environment variables from .env file; the settings below read them
 
-from supabase import create_client, Client
-import jwt
-import requests
+from jwks_cache import JWKSCache
+from caches import LRUCache, PersistentLRUCache, SharedVersions, VersionedSnapshotCache
+from metrics import LatencyRecorder, StructuredOutputStats
+from prefilter import prefilter_profile
+from offline_match import offline_match
+from streaming_json import IncrementalObjectParser
+from prompt_encoding import PROMPT_ENCODINGS, TokenAccounting, encode_items, format_note
+from clients import registry, get_gemini_client, get_supabase_client, get_async_supabase_client
+from async_runtime import runtime
+import asyncio
+from resume_jobs import ResumeJobQueue, ResumeJobWorkers
+from limiter import AdaptiveLimiter, Overloaded
+from resilience import CallPolicy, is_connect_error, is_outage_error
+from breakers import CircuitBreaker
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Routes live on this blueprint; create_app() builds the Flask app around it.
+# Importing this module constructs no clients, opens no connections and
+# creates no files: heavy libraries (google.genai, supabase, PyPDF2, jwt, and
+# pydantic via schemas.py) are imported and clients built on first use. See
+# startup_profile.py.
+api = Blueprint("api", __name__)
 
-app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+def create_app(config: dict = None) -> Flask:
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    # "memory" parses uploads from a spooled buffer; "disk" also archives them to UPLOAD_FOLDER
+    app.config['UPLOAD_MODE'] = os.getenv("UPLOAD_MODE", "memory")
+    # Uploads larger than this spill from memory to a temp file that is removed after parsing
+    app.config['UPLOAD_SPOOL_MAX_BYTES'] = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+    app.config.update(config or {})
+    if app.config['UPLOAD_MODE'] == 'disk':
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    app.register_blueprint(api)
+    return app
 
-@app.route('/')
+# Gemini shedding load (429/503, timeouts, or our own limiter queue timing
+# out) is a 503 with Retry-After, not a 500
+@api.errorhandler(Overloaded)
+def overloaded(e):
+    print("Overloaded:", e)
+    return {"error": "Service overloaded, retry shortly"}, 503, {"Retry-After": str(max(1, round(e.retry_after)))}
+
+_app = None
+_app_lock = threading.Lock()
+
+# `app` (used by serve.py, `flask run` and `from app import app`) is created on first access
+def __getattr__(name):
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+        return _app
+
+# One circuit breaker per dependency. After repeated outage errors (timeouts,
+# dropped connections, 5xx) calls fail fast with a 503 instead of each waiting
+# out its own timeout; state is on /status.
+supabase_breaker = CircuitBreaker.from_env("supabase", "SUPABASE", is_outage_error)
+gemini_breaker = CircuitBreaker.from_env("gemini", "GEMINI", is_outage_error)
+jwks_breaker = CircuitBreaker.from_env("jwks", "JWKS", is_outage_error, failure_threshold=3, reset_timeout=60)
+circuit_breakers = (supabase_breaker, gemini_breaker, jwks_breaker)
+
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL", "https://mint-kite-79.clerk.accounts.dev/.well-known/jwks.json")
+JWKS_MIN_REFRESH_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_SECONDS", "60"))
+jwks_cache = JWKSCache(CLERK_JWKS_URL, min_refresh_interval=JWKS_MIN_REFRESH_SECONDS, breaker=jwks_breaker)
+# sha256(token) -> Clerk user id, kept until the token's exp
+verified_token_cache = LRUCache(max_entries=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000")))
+
+# Process-wide AIMD limit on Gemini calls in flight, shared by matching and
+# profile extraction. Calls past the limit queue for up to GEMINI_QUEUE_TIMEOUT_SECONDS.
+gemini_limiter = AdaptiveLimiter(
+    "gemini",
+    initial=int(os.getenv("GEMINI_CONCURRENCY_INITIAL", "8")),
+    min_limit=int(os.getenv("GEMINI_CONCURRENCY_MIN", "1")),
+    max_limit=int(os.getenv("GEMINI_CONCURRENCY_MAX", "64")),
+    queue_timeout=float(os.getenv("GEMINI_QUEUE_TIMEOUT_SECONDS", "30")),
+)
+
+# Retries, per-attempt timeouts and hedging per class of outbound call (see
+# resilience.py). Reads are idempotent, so slow ones are hedged. Writes are
+# retried but never hedged: a timed-out attempt may still land, so they are
+# only for statements that can be applied twice (updates, deletes, upserts).
+# Plain inserts would duplicate rows, so they are only retried when the
+# request never reached Supabase. Gemini gets one retry and a long timeout,
+# and each attempt holds a gemini_limiter slot.
+supabase_reads = CallPolicy.from_env("supabase_read", "SUPABASE_READ", attempts=3, timeout=10, hedge_percentile=95, breaker=supabase_breaker)
+supabase_writes = CallPolicy.from_env("supabase_write", "SUPABASE_WRITE", attempts=3, timeout=20, breaker=supabase_breaker)
+supabase_inserts = CallPolicy.from_env("supabase_insert", "SUPABASE_INSERT", attempts=3, timeout=20, breaker=supabase_breaker, retry_if=is_connect_error)
+gemini_calls = CallPolicy.from_env("gemini", "GEMINI_CALL", attempts=2, backoff=0.5, max_backoff=5.0, timeout=120, breaker=gemini_breaker, limiter=gemini_limiter)
+# The HTTP clients time out with the attempts (per connect/read/write, not in total)
+registry.timeouts.update(
+    gemini=gemini_calls.timeout,
+    supabase=max((t for t in (supabase_reads.timeout, supabase_writes.timeout, supabase_inserts.timeout) if t), default=None),
+)
+
+# Background resume processing for /upload?async=1. Under serve.py the
+# master runs the workers and the web workers only enqueue; otherwise they are
+# started on the first async upload, not at import, so worker processes that
+# import this module don't spawn workers of their own.
+RESUME_JOBS_DB = os.getenv("RESUME_JOBS_DB", "resume_jobs.sqlite3")
+# A running job whose worker stops renewing its lease for this long is picked up again
+RESUME_JOB_LEASE_SECONDS = float(os.getenv("RESUME_JOB_LEASE_SECONDS", "60"))
+resume_job_queue = ResumeJobQueue(RESUME_JOBS_DB, lease_seconds=RESUME_JOB_LEASE_SECONDS)
+resume_job_workers = ResumeJobWorkers(
+    RESUME_JOBS_DB,
+    num_workers=int(os.getenv("RESUME_JOB_WORKERS", "2")),
+    lease_seconds=RESUME_JOB_LEASE_SECONDS,
+)
+
+# "<clerk user id>:<sha256 of the uploaded PDF>" -> {"profile": extracted
+# profile JSON, "version": the user's profile version once it was saved}.
+# Kept in UPLOAD_DEDUP_DB (the resume job file by default) so serve.py's web
+# workers and the resume job workers all share it; empty keeps it in memory.
+UPLOAD_DEDUP_DB = os.getenv("UPLOAD_DEDUP_DB", RESUME_JOBS_DB)
+UPLOAD_DEDUP_MAX_ENTRIES = int(os.getenv("UPLOAD_DEDUP_MAX_ENTRIES", "5000"))
+if UPLOAD_DEDUP_DB:
+    upload_dedup_cache = PersistentLRUCache(UPLOAD_DEDUP_DB, max_entries=UPLOAD_DEDUP_MAX_ENTRIES)
+else:
+    upload_dedup_cache = LRUCache(max_entries=UPLOAD_DEDUP_MAX_ENTRIES)
+
+@api.route('/')
 def index():
     return render_template('index.html')
 
-# Helper to get Clerk public key (JWKS)
+# Dependency health for load balancers and dashboards. Always 200: a
+# dependency being down doesn't make this instance unfit to serve.
+@api.route('/status')
+def status():
+    breakers = {breaker.name: breaker.stats() for breaker in circuit_breakers}
+    degraded = [name for name, breaker in breakers.items() if breaker["state"] != "closed"]
+    return {"status": "degraded" if degraded else "ok", "degraded": degraded, "breakers": breakers}
+
+@api.route('/stats')
+def stats():
+    return {
+        "jwks": jwks_cache.stats(),
+        "verified_tokens": verified_token_cache.stats(),
+        "upload_dedup": upload_dedup_cache.stats(),
+        "http_pools": registry.pool_stats(),
+        "match_engines": {engine: recorder.stats() for engine, recorder in match_engine_latency.items()},
+        "match_results": match_result_cache.stats(),
+        "profile_snapshots": profile_snapshot_cache.stats(),
+        "structured_output": structured_output_stats.stats(),
+        "gemini_limiter": gemini_limiter.stats(),
+        "breakers": {breaker.name: breaker.stats() for breaker in circuit_breakers},
+        "call_policies": {policy.name: policy.stats() for policy in (supabase_reads, supabase_writes, supabase_inserts, gemini_calls)},
+        "match_prompts": {
+            "encoding": PROMPT_ENCODING,
+            "tokens": prompt_token_accounting.stats(),
+            "gemini_latency": {encoding: recorder.stats() for encoding, recorder in gemini_match_latency.items()},
+        },
+        "profile_fetch": {mode: recorder.stats() for mode, recorder in profile_fetch_latency.items()},
+        "resume_jobs": {**resume_job_queue.counts(), "workers_alive": resume_job_workers.alive()},
+    }
+
+# Verify a Clerk token against the cached Clerk public keys (JWKS)
 def verify_clerk_token(token):
-    jwks_url = "https://mint-kite-79.clerk.accounts.dev/.well-known/jwks.json"
-    jwk_client = jwt.PyJWKClient(jwks_url)
-    signing_key = jwk_client.get_signing_key_from_jwt(token)
+    import jwt
+    # The digest covers the whole token (header, claims and signature), so a
+    # tampered token never maps to a cached entry.
+    token_digest = hashlib.sha256(token.encode()).hexdigest()
+    cached_sub = verified_token_cache.get(token_digest)
+    if cached_sub is not None:
+        return cached_sub
+
+    signing_key = jwks_cache.get_signing_key_from_jwt(token)
     decoded = jwt.decode(
         token,
         signing_key.key,
@@ -35,179 +186,564 @@ def verify_clerk_token(token):
         audience=os.getenv("CLERK_CLIENT_ID"),
     )
     print("Decoded Clerk token:", decoded)
+    if decoded.get("exp") and decoded["exp"] > time.time():
+        verified_token_cache.set(token_digest, decoded["sub"], expires_at=decoded["exp"])
     return decoded["sub"]  # Clerk user ID
 
-@app.route('/upload', methods=['POST'])
-def upload():
-    # 1. Get and verify Clerk token
+# Verify the bearer token on the current request. Returns (clerk_user_id, None)
+# or (None, error response).
+def authenticate_request():
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
-        return {"error": "Missing or invalid Authorization header"}, 401
+        return None, ({"error": "Missing or invalid Authorization header"}, 401)
     token = auth_header.split(" ", 1)[1]
     try:
-        clerk_user_id = verify_clerk_token(token)
-        print("Clerk user id:", clerk_user_id)
+        return verify_clerk_token(token), None
     except Exception as e:
         print("Token verification failed:", e)
-        return {"error": "Invalid Clerk token"}, 401
+        return None, ({"error": "Invalid Clerk token"}, 401)
+
+def is_truthy(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+# Keep a copy of the upload in UPLOAD_FOLDER (disk mode only). The digest
+# prefix stops concurrent uploads of the same filename overwriting each other.
+def archive_upload(spool, filename: str, file_digest: str):
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{file_digest[:16]}_{secure_filename(filename)}")
+    with open(filepath, "wb") as out:
+        out.write(spool.read())
+    spool.seek(0)
+
+@api.route('/upload', methods=['POST'])
+def upload():
+    # 1. Get and verify Clerk token
+    clerk_user_id, error = authenticate_request()
+    if error:
+        return error
+    print("Clerk user id:", clerk_user_id)
 
     uploaded_file = request.files['resume']
     if uploaded_file.filename.endswith('.pdf'):
-        filename = secure_filename(uploaded_file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        uploaded_file.save(filepath)
-
-        # Extract text from PDF
-        reader = PdfReader(filepath)
-        extracted_text = ""
-        for page in reader.pages:
-            extracted_text += page.extract_text() or ""
-
-        # Extract structured profile using Gemini
-        gemini_api_key = os.getenv('GEMINI_API_KEY')
-        profile_json = extract_profile_with_gemini(extracted_text, gemini_api_key)
-        # print("Extracted profile JSON:", profile_json)
-        save_profile_to_supabase(profile_json, clerk_user_id)
+        spool, file_digest = spool_upload(uploaded_file.stream, current_app.config['UPLOAD_SPOOL_MAX_BYTES'])
+        with spool:
+            # Same PDF already processed for this user: skip parsing and Gemini,
+            # and saving too unless the profile has changed since
+            force = is_truthy(request.args.get('force') or request.form.get('force'))
+            cached = None if force else upload_dedup_cache.get(upload_dedup_key(clerk_user_id, file_digest))
+            if cached is not None:
+                if upload_is_current(clerk_user_id, cached):
+                    print("Duplicate upload, stored profile is current for:", clerk_user_id)
+                else:
+                    print("Duplicate upload, re-saving stored profile for:", clerk_user_id)
+                    save_profile_to_supabase(cached["profile"], clerk_user_id)
+                    remember_upload(clerk_user_id, file_digest, cached["profile"])
+                return f"<h2>Extracted Profile JSON</h2><pre>{json.dumps(cached['profile'], indent=2)}</pre>"
+
+            if current_app.config['UPLOAD_MODE'] == 'disk':
+                archive_upload(spool, uploaded_file.filename, file_digest)
+
+            if is_truthy(request.args.get('async') or request.form.get('async')):
+                resume_job_workers.ensure_started()
+                job_id = resume_job_queue.enqueue(clerk_user_id, spool.read(), file_digest)
+                return {"job_id": job_id, "status": "queued", "status_url": f"/upload-jobs/{job_id}"}, 202
+
+            profile_json = process_resume(spool, clerk_user_id)
+
+        remember_upload(clerk_user_id, file_digest, profile_json)
 
         return f"<h2>Extracted Profile JSON</h2><pre>{json.dumps(profile_json, indent=2)}</pre>"
     else:
         return "Only PDF files are allowed."
 
-@app.route('/match-job', methods=['POST'])
-def match_job_to_profile():
-    data = request.get_json()
-    job_description = data.get('job_description')
-    job_id = data.get('job_id')
-    print("Job description:", job_description)
-    print("Job id:", job_id)
-    token = request.headers.get("Authorization")
-    print("Here is the fokin token", token)
-    
+def upload_dedup_key(clerk_user_id: str, file_digest: str) -> str:
+    return f"{clerk_user_id}:{file_digest}"
+
+# Record a processed upload, right after its profile was saved (also called by
+# the resume job workers)
+def remember_upload(clerk_user_id: str, file_digest: str, profile_json: dict):
+    if profile_json:
+        upload_dedup_cache.set(upload_dedup_key(clerk_user_id, file_digest), {
+            "profile": profile_json,
+            "version": profile_snapshot_cache.version(clerk_user_id),
+        })
+
+# Whether nothing was saved for this user since the cached upload was. Only
+# shared versions can tell; per-process ones miss other processes' saves.
+def upload_is_current(clerk_user_id: str, cached: dict) -> bool:
+    if profile_snapshot_cache.shared_versions is None:
+        return False
+    return cached["version"] == profile_snapshot_cache.version(clerk_user_id)
 
+@api.route('/upload-jobs/<job_id>')
+def upload_job_status(job_id):
+    clerk_user_id, error = authenticate_request()
+    if error:
+        return error
+    job = resume_job_queue.get(job_id)
+    if not job or job["clerk_user_id"] != clerk_user_id:
+        return {"error": "Job not found"}, 404
+    return job
+
+# Shared resume pipeline: PDF text extraction, Gemini extraction, Supabase save.
+# `pdf` is raw bytes or a binary file object; `progress` is called with each stage name.
+def process_resume(pdf, clerk_user_id: str, progress=None) -> dict:
+    report = progress or (lambda stage: None)
+    if isinstance(pdf, (bytes, bytearray)):
+        pdf = io.BytesIO(pdf)
+
+    # Extract text from PDF
+    report("extracting_text")
+    page_timings = []
+    extracted_text = extract_pdf_text(pdf, page_timings)
+    print(f"Parsed {len(page_timings)} pages in {sum(page_timings):.3f}s, per page:",
+          [round(t, 3) for t in page_timings])
+
+    # Extract structured profile using Gemini
+    report("extracting_profile")
+    gemini_api_key = os.getenv('GEMINI_API_KEY')
+    profile_json = extract_profile_with_gemini(extracted_text, gemini_api_key)
+    # print("Extracted profile JSON:", profile_json)
+    report("saving")
+    save_profile_to_supabase(profile_json, clerk_user_id)
+    return profile_json
+
+@api.route('/match-job', methods=['POST'])
+def match_job_to_profile():
     # Get and verify Clerk token
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return {"error": "Missing or invalid Authorization header"}, 401
-    token = auth_header.split(" ", 1)[1]
-    try:
-        clerk_user_id = verify_clerk_token(token)
-        print("Clerk user id:", clerk_user_id)
-    except Exception as e:
-        print("Token verification failed:", e)
-        return {"error": "Invalid Clerk token"}, 401
+    clerk_user_id, error = authenticate_request()
+    if error:
+        return error
+    print("Clerk user id:", clerk_user_id)
+
+    options, error = match_request_options()
+    if error:
+        return error
+    user_id = clerk_user_id
+    job_id = options["job_id"]
+    job_description = options["job_description"]
+
+    supabase = get_supabase_client()
+    profile = fetch_profile_from_supabase(user_id)
+    if not profile:
+        return {"error": "User profile not found"}, 404
+
+    # With streaming, match rows start writing while Gemini is still generating.
+    # The write pool is this request's own, so concurrent requests never queue
+    # behind each other's writes.
+    with ThreadPoolExecutor(max_workers=MATCH_WRITE_CONCURRENCY, thread_name_prefix="match-write") as write_pool:
+        match_writer = JobMatchWriter(supabase, job_id, user_id, profile, write_pool)
+        gemini_response = run_match(
+            profile, job_description, options["engine"],
+            force=options["force"],
+            on_field=match_writer.on_field if options["stream"] else None,
+        )
+
+        if not update_job_description(supabase, job_id, user_id, gemini_response, job_description):
+            return {"error": "Failed to update job description"}, 500
 
-    # Accept clerk_user_id from form if present (for flexibility)
+        # Create job_matches, project_matches and experience_matches
+        matches = match_writer.finish(gemini_response)
+
+    return {
+        "job_id": job_id,
+        **matches
+    }
+
+# Job, engine and flags from a /match-job body (JSON or form). Returns
+# (options, None) or (None, error response). The user is always the token's;
+# a clerk_user_id in the body is ignored.
+def match_request_options():
     if request.is_json:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         job_description = data.get('job_description')
-        job_id = data.get('job_id')  # Get job_id from request
-        user_id = data.get('clerk_user_id', clerk_user_id)
     else:
-        job_description = request.form.get('job_text')
-        job_id = request.form.get('job_id')  # Get job_id from form
-        user_id = request.form.get('clerk_user_id', clerk_user_id)
-
+        data = request.form
+        job_description = data.get('job_text')
+    job_id = data.get('job_id')
     if not job_description:
-        return {"error": "Missing job description"}, 400
-    if not user_id:
-        return {"error": "Missing user id"}, 400
+        return None, ({"error": "Missing job description"}, 400)
     if not job_id:
-        return {"error": "Missing job id"}, 400
+        return None, ({"error": "Missing job id"}, 400)
+    engine = data.get('engine') or MATCH_ENGINE
+    if engine not in MATCH_ENGINES:
+        return None, ({"error": f"Unknown match engine: {engine}"}, 400)
+    return {
+        "job_id": job_id,
+        "job_description": job_description,
+        "engine": engine,
+        "force": is_truthy(data.get('force')),
+        "stream": is_truthy(data.get('stream', GEMINI_STREAMING)),
+    }, None
 
-    profile = fetch_profile_from_supabase(user_id)
+BATCH_MATCH_MAX_JOBS = int(os.getenv("BATCH_MATCH_MAX_JOBS", "50"))
+# Match calls in flight at once for one batch request
+BATCH_MATCH_CONCURRENCY = int(os.getenv("BATCH_MATCH_CONCURRENCY", "8"))
+
+@api.route('/match-jobs', methods=['POST'])
+def match_jobs_batch():
+    # Many job descriptions against one profile: the token is verified and the
+    # profile fetched once, matches run concurrently and each job's result is
+    # streamed back (one JSON object per line) as soon as it finishes.
+    clerk_user_id, error = authenticate_request()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    jobs = data.get('jobs')
+    if not isinstance(jobs, list) or not jobs:
+        return {"error": "Missing jobs"}, 400
+    if len(jobs) > BATCH_MATCH_MAX_JOBS:
+        return {"error": f"At most {BATCH_MATCH_MAX_JOBS} jobs per batch"}, 400
+    if any(not isinstance(job, dict) or not job.get('job_id') or not job.get('job_description') for job in jobs):
+        return {"error": "Every job needs a job_id and a job_description"}, 400
+    engine = data.get('engine') or MATCH_ENGINE
+    if engine not in MATCH_ENGINES:
+        return {"error": f"Unknown match engine: {engine}"}, 400
+    force = is_truthy(data.get('force'))
+
+    supabase = get_supabase_client()
+    profile = fetch_profile_from_supabase(clerk_user_id)
     if not profile:
         return {"error": "User profile not found"}, 404
-    gemini_input = build_gemini_prompt(profile, job_description)
-    gemini_response = send_to_gemini(gemini_input)
-    print(gemini_response)
-
-    # Parse Gemini output for job info and matches
-    job_title = gemini_response.get("job_title")
-    job_company = gemini_response.get("job_company")
-    job_raw_description = gemini_response.get("job_raw_description", job_description)
-    matched_skill_ids = gemini_response.get("matched_skill_ids", [])
-    matched_project_ids = gemini_response.get("matched_project_ids", [])
-    matched_experience_ids = gemini_response.get("matched_experience_ids", [])
-    improved_descriptions = gemini_response.get("improved_descriptions", {})
-
-    # Update existing job in job_descriptions
-    job_update = supabase.table("job_descriptions").update({
-        "title": job_title,
-        "company": job_company,
-        "raw_description": job_raw_description
-    }).eq("id", job_id).eq("profile_id", user_id).execute()
-
-    if not job_update.data:
-        return {"error": "Failed to update job description"}, 500
-
-    # 2. Create job_matches (skills)
-    for skill_id in matched_skill_ids:
-        try:
-            supabase.table("job_matches").insert({
-                "job_id": job_id,
-                "skill_id": skill_id
-            }).execute()
-        except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass
-            else:
-                raise
 
-    # 3. Create project_matches
-    for project_id in matched_project_ids:
-        improved_desc = improved_descriptions.get(str(project_id)) or improved_descriptions.get(project_id) or None
-        try:
-            supabase.table("project_matches").insert({
-                "job_id": job_id,
-                "project_id": project_id,
-                "improved_description": improved_desc
-            }).execute()
-        except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass
-            else:
-                raise
+    # One ownership check for the whole batch
+    job_ids = [job['job_id'] for job in jobs]
+    owned = supabase_reads.call(supabase.table("job_descriptions").select("id").eq("profile_id", clerk_user_id).in_("id", job_ids).execute).data
+    owned_ids = {str(row["id"]) for row in owned or []}
+
+    # Matches run as coroutines on the AsyncRuntime loop, so one request keeps
+    # up to BATCH_MATCH_CONCURRENCY Gemini calls in flight without a thread each
+    semaphore = asyncio.Semaphore(min(BATCH_MATCH_CONCURRENCY, len(jobs)))
 
-    # 4. Create experience_matches
-    for exp_id in matched_experience_ids:
-        improved_desc = improved_descriptions.get(str(exp_id)) or improved_descriptions.get(exp_id) or None
+    def generate():
+        for job in jobs:
+            if str(job['job_id']) not in owned_ids:
+                yield json.dumps({"job_id": job['job_id'], "error": "Job not found"}) + "\n"
+
+        persisted = {spec[0]: {"inserted": 0, "duplicates": 0} for spec in MATCH_TABLES}
+        futures = {
+            runtime.submit(match_batch_job(semaphore, job, clerk_user_id, profile, engine, force)): job['job_id']
+            for job in jobs if str(job['job_id']) in owned_ids
+        }
         try:
-            supabase.table("experience_matches").insert({
-                "job_id": job_id,
-                "experience_id": exp_id,
-                "improved_description": improved_desc
-            }).execute()
-        except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass
+            for future in as_completed(futures, timeout=BATCH_MATCH_TIMEOUT):
+                result, counts = future.result()
+                for table, (inserted, duplicates) in counts.items():
+                    persisted[table]["inserted"] += inserted
+                    persisted[table]["duplicates"] += duplicates
+                yield json.dumps(result) + "\n"
+        except FutureTimeoutError:
+            for future, job_id in futures.items():
+                if not future.done():
+                    yield json.dumps({"job_id": job_id, "error": "Service overloaded, retry shortly"}) + "\n"
+        finally:
+            # Timed out, or the client went away: stop the jobs still running
+            for future in futures:
+                future.cancel()
+
+        totals = {table: counts for table, counts in persisted.items() if counts["inserted"] or counts["duplicates"]}
+        yield json.dumps({"done": True, "persisted": totals}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# "gemini" asks the LLM for matches and improved descriptions; "offline"
+# ranks ids locally (offline_match.py) with no network call and no rewrites.
+MATCH_ENGINES = ("gemini", "offline")
+MATCH_ENGINE = os.getenv("MATCH_ENGINE", "gemini")
+if MATCH_ENGINE not in MATCH_ENGINES:
+    raise ValueError(f"MATCH_ENGINE must be one of {MATCH_ENGINES}, got {MATCH_ENGINE!r}")
+match_engine_latency = {engine: LatencyRecorder() for engine in MATCH_ENGINES}
+
+# Stream Gemini match responses and hand each top-level field over as soon as it parses
+GEMINI_STREAMING = os.getenv("GEMINI_STREAMING", "0")
+
+def run_match(profile: dict, job_description: str, engine: str = None, force: bool = False, on_field=None) -> dict:
+    engine = engine or MATCH_ENGINE
+    with match_engine_latency[engine].time():
+        result, cache_key, gemini_input = prepare_match(profile, job_description, engine, force)
+        if result is not None:
+            return result
+        gemini_response = send_to_gemini(gemini_input, on_field=on_field)
+        print(gemini_response)
+        store_match(cache_key, gemini_response)
+        return gemini_response
+
+# The local part of a match, before any Gemini call: (result, None, None) when
+# the offline engine or the cache answers, else (None, cache key, prompt).
+def prepare_match(profile: dict, job_description: str, engine: str, force: bool):
+    if engine == "offline":
+        return offline_match(profile, job_description), None, None
+
+    # Same profile + same job description: reuse the earlier Gemini result
+    cache_key = match_cache_key(profile, job_description)
+    gemini_response = None if force else match_result_cache.get(cache_key)
+    if gemini_response is not None:
+        print("Match cache hit")
+        return gemini_response, None, None
+
+    # Only the items most relevant to this posting go into the prompt
+    prompt_profile = prefilter_profile(profile, job_description)
+    return None, cache_key, build_gemini_prompt(prompt_profile, job_description)
+
+def store_match(cache_key: str, gemini_response: dict):
+    if "error" not in gemini_response:
+        match_result_cache.set(cache_key, gemini_response)
+
+# Gemini match results keyed by (rendered profile section, normalized job
+# description). Set MATCH_CACHE_DB to keep entries across restarts.
+MATCH_CACHE_TTL_SECONDS = float(os.getenv("MATCH_CACHE_TTL_SECONDS", str(24 * 3600)))
+MATCH_CACHE_MAX_ENTRIES = int(os.getenv("MATCH_CACHE_MAX_ENTRIES", "2000"))
+if os.getenv("MATCH_CACHE_DB"):
+    match_result_cache = PersistentLRUCache(os.getenv("MATCH_CACHE_DB"), max_entries=MATCH_CACHE_MAX_ENTRIES, ttl=MATCH_CACHE_TTL_SECONDS)
+else:
+    match_result_cache = LRUCache(max_entries=MATCH_CACHE_MAX_ENTRIES, ttl=MATCH_CACHE_TTL_SECONDS)
+
+def normalize_job_description(job_description: str) -> str:
+    return " ".join(job_description.split())
+
+def match_cache_key(profile: dict, job_description: str) -> str:
+    # The prompt rendered without a job description is exactly the profile
+    # section the model sees, so any profile edit changes the key.
+    profile_section = build_gemini_prompt(profile, "")
+    digest = hashlib.sha256()
+    digest.update(profile_section.encode())
+    digest.update(b"\0")
+    digest.update(normalize_job_description(job_description).encode())
+    return digest.hexdigest()
+
+# Store the title, company and description the match produced on the job row.
+# Returns False when the job doesn't exist or belongs to another user.
+def update_job_description(supabase, job_id, user_id: str, gemini_response: dict, job_description: str) -> bool:
+    job_update = supabase_writes.call(job_update_query(supabase, job_id, user_id, gemini_response, job_description).execute)
+    return bool(job_update.data)
+
+def job_update_query(supabase, job_id, user_id: str, gemini_response: dict, job_description: str):
+    return supabase.table("job_descriptions").update(
+        job_update_fields(gemini_response, job_description)
+    ).eq("id", job_id).eq("profile_id", user_id)
+
+def job_update_fields(gemini_response: dict, job_description: str) -> dict:
+    # The offline engine leaves title/company unknown; don't overwrite them with null
+    job_fields = {
+        "title": gemini_response.get("job_title"),
+        "company": gemini_response.get("job_company"),
+        "raw_description": gemini_response.get("job_raw_description") or job_description
+    }
+    return {key: value for key, value in job_fields.items() if value is not None}
+
+# Bulk writes for the three match tables run concurrently, from a pool of
+# this size that each request creates for itself
+MATCH_WRITE_CONCURRENCY = int(os.getenv("MATCH_WRITE_CONCURRENCY", "3"))
+
+# Keep only ids that belong to the profile, mapped back to their stored
+# values (the model may echo ids as strings); order and uniqueness preserved.
+def valid_matched_ids(matched_ids, items: list) -> list:
+    known = {str(item["id"]): item["id"] for item in items}
+    valid = []
+    for matched_id in matched_ids or []:
+        item_id = known.get(str(matched_id))
+        if item_id is not None and item_id not in valid:
+            valid.append(item_id)
+    dropped = [matched_id for matched_id in matched_ids or [] if str(matched_id) not in known]
+    if dropped:
+        print("Dropping matched ids not in profile:", dropped)
+    return valid
+
+# (match table, conflict target, id column, response field, profile category)
+MATCH_TABLES = [
+    ("job_matches", "job_id,skill_id", "skill_id", "matched_skill_ids", "skills"),
+    ("project_matches", "job_id,project_id", "project_id", "matched_project_ids", "projects"),
+    ("experience_matches", "job_id,experience_id", "experience_id", "matched_experience_ids", "experiences"),
+]
+
+# Validated ids and rows for one match table, from a match response
+def build_match_rows(spec, job_id, profile: dict, response: dict):
+    from schemas import improved_description_map
+    table, _, id_column, field, category = spec
+    ids = valid_matched_ids(response.get(field, []), profile[category])
+    improved_descriptions = improved_description_map(response.get("improved_descriptions"))
+    rows = []
+    for item_id in ids:
+        row = {"job_id": job_id, id_column: item_id}
+        if table != "job_matches":
+            row["improved_description"] = improved_descriptions.get(str(item_id)) or improved_descriptions.get(item_id) or None
+        rows.append(row)
+    return ids, rows
+
+class JobMatchWriter:
+    """Writes the match rows for one job, each table as soon as it can be.
+
+    Fed from a streaming Gemini response through `on_field`, a table is
+    written once its id list (and, for projects and experiences, the
+    improved descriptions) has been parsed, while the model is still
+    generating the rest. Those rows come from output that hasn't been
+    validated yet, so `finish` checks every table against the final
+    response: where the early rows differ (the attempt failed validation
+    and was retried, or there is no result at all) it deletes the rows the
+    early write added and writes the final ones. It returns the persisted
+    ids. Writes run on `executor`, which belongs to the request.
+    """
+
+    def __init__(self, supabase, job_id, user_id: str, profile: dict, executor):
+        self.supabase = supabase
+        self.executor = executor
+        self.job_id = job_id
+        self.user_id = user_id
+        self.profile = profile
+        self.fields = {}
+        self.futures = {}
+        self.finished = False
+        self._lock = threading.Lock()
+        self._owns_job = None
+
+    def owns_job(self) -> bool:
+        # Early writes happen before the job row is updated, so check ownership first
+        with self._lock:
+            if self._owns_job is None:
+                resp = supabase_reads.call(self.supabase.table("job_descriptions").select("id").eq("id", self.job_id).eq("profile_id", self.user_id).limit(1).execute)
+                self._owns_job = first_row(resp) is not None
+            return self._owns_job
+
+    def on_field(self, key, value):
+        with self._lock:
+            # An abandoned attempt can keep streaming after finish() started
+            if self.finished:
+                return
+            self.fields[key] = value
+            ready = [
+                spec for spec in MATCH_TABLES
+                if spec[0] not in self.futures
+                and spec[3] in self.fields
+                and (spec[0] == "job_matches" or "improved_descriptions" in self.fields)
+            ]
+            for spec in ready:
+                self.futures[spec[0]] = self.executor.submit(self._write_early, spec, dict(self.fields))
+
+    def _write_early(self, spec, fields: dict):
+        # (rows written, rows actually inserted) for finish() to reconcile
+        table, on_conflict, *_ = spec
+        if not self.owns_job():
+            raise PermissionError(f"Job {self.job_id} does not belong to {self.user_id}")
+        _, rows = build_match_rows(spec, self.job_id, self.profile, fields)
+        return rows, upsert_new_rows(self.supabase, table, rows, on_conflict)
+
+    def _write_final(self, spec, response: dict, early_future) -> list:
+        table, on_conflict, id_column, *_ = spec
+        ids, rows = build_match_rows(spec, self.job_id, self.profile, response)
+        if early_future is not None:
+            try:
+                early_rows, inserted = early_future.result()
+            except Exception as e:
+                # A failed upsert wrote nothing; the final write below covers it
+                print(f"Early {table} write failed:", e)
             else:
-                raise
+                if early_rows == rows:
+                    return ids
+                inserted_ids = [row[id_column] for row in inserted]
+                if inserted_ids:
+                    supabase_writes.call(self.supabase.table(table).delete().eq("job_id", self.job_id).in_(id_column, inserted_ids).execute)
+        if rows:
+            bulk_upsert_ignore_duplicates(self.supabase, table, rows, on_conflict)
+        return ids
+
+    def finish(self, response: dict) -> dict:
+        with self._lock:
+            self.finished = True
+            early = dict(self.futures)
+        futures = {
+            spec[3]: self.executor.submit(self._write_final, spec, response, early.get(spec[0]))
+            for spec in MATCH_TABLES
+        }
+        return {field: future.result() for field, future in futures.items()}
+
+# "embedded" loads the profile and all its child tables in one PostgREST
+# request; "sequential" is the one-query-per-table path, kept for comparison.
+PROFILE_FETCH_MODE = os.getenv("PROFILE_FETCH_MODE", "embedded")
+# Fraction of embedded fetches that also time the sequential path
+PROFILE_FETCH_COMPARE_RATE = float(os.getenv("PROFILE_FETCH_COMPARE_RATE", "0"))
+profile_fetch_latency = {"embedded": LatencyRecorder(), "sequential": LatencyRecorder()}
 
+PROFILE_AGGREGATE_SELECT = (
+    "clerk_user_id, name, email, phone, "
+    "skills(id, name), "
+    "projects(id, name, description, link), "
+    "work_experiences(id, position, company, duration, description), "
+    "education(id, degree, institution, year), "
+    "links(id, url)"
+)
+
+# Profile snapshots per user. save_profile_to_supabase bumps the version so
+# no process serves a pre-save snapshot: versions live in PROFILE_VERSIONS_DB
+# (by default the resume job queue's file), so a save in a resume job worker
+# reaches every web worker. Set it empty for per-process versions. The TTL
+# bounds staleness for edits made elsewhere (the Next.js dashboard).
+PROFILE_VERSIONS_DB = os.getenv("PROFILE_VERSIONS_DB", RESUME_JOBS_DB)
+profile_snapshot_cache = VersionedSnapshotCache(
+    max_entries=int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "2000")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300")),
+    shared_versions=SharedVersions(PROFILE_VERSIONS_DB) if PROFILE_VERSIONS_DB else None,
+)
+
+def fetch_profile_from_supabase(clerk_user_id: str) -> dict:
+    profile = profile_snapshot_cache.get(clerk_user_id)
+    if profile is not None:
+        return profile
+    version = profile_snapshot_cache.version(clerk_user_id)
+    profile = load_profile_from_supabase(clerk_user_id)
+    if profile is not None:
+        profile_snapshot_cache.set(clerk_user_id, version, profile)
+    return profile
+
+def load_profile_from_supabase(clerk_user_id: str) -> dict:
+    mode = "sequential" if PROFILE_FETCH_MODE == "sequential" else "embedded"
+    fetch = fetch_profile_sequential if mode == "sequential" else fetch_profile_embedded
+    with profile_fetch_latency[mode].time():
+        profile = fetch(clerk_user_id)
+    if mode == "embedded" and random.random() < PROFILE_FETCH_COMPARE_RATE:
+        with profile_fetch_latency["sequential"].time():
+            fetch_profile_sequential(clerk_user_id)
+    return profile
+
+def fetch_profile_embedded(clerk_user_id: str) -> dict:
+    supabase = get_supabase_client()
+    profile_data = first_row(supabase_reads.call(supabase.table("user_profiles").select(PROFILE_AGGREGATE_SELECT).eq("clerk_user_id", clerk_user_id).limit(1).execute))
+    if not profile_data:
+        return None
     return {
-        "job_id": job_id,
-        "matched_skill_ids": matched_skill_ids,
-        "matched_project_ids": matched_project_ids,
-        "matched_experience_ids": matched_experience_ids
+        "profile_id": profile_data["clerk_user_id"],
+        "name": profile_data.get("name"),
+        "email": profile_data.get("email"),
+        "phone": profile_data.get("phone"),
+        "skills": profile_data.get("skills") or [],
+        "projects": profile_data.get("projects") or [],
+        "experiences": profile_data.get("work_experiences") or [],
+        "education": profile_data.get("education") or [],
+        "links": profile_data.get("links") or []
     }
 
-def fetch_profile_from_supabase(clerk_user_id: str) -> dict:
+# First row of a select, or None. Used instead of maybe_single(), which
+# re-raises every failure (a 503 included) as a generic "Missing response".
+def first_row(resp):
+    return resp.data[0] if resp.data else None
+
+def fetch_profile_sequential(clerk_user_id: str) -> dict:
+    supabase = get_supabase_client()
     # Fetch the user profile by clerk_user_id
-    profile_resp = supabase.table("user_profiles").select("*").eq("clerk_user_id", clerk_user_id).maybe_single().execute()
-    if not profile_resp or not profile_resp.data:
+    profile_data = first_row(supabase_reads.call(supabase.table("user_profiles").select("*").eq("clerk_user_id", clerk_user_id).limit(1).execute))
+    if not profile_data:
         return None
-    profile_data = profile_resp.data
     profile_id = profile_data["clerk_user_id"]
 
     # Fetch skills
-    skills = supabase.table("skills").select("id, name").eq("profile_id", profile_id).execute().data
+    skills = supabase_reads.call(supabase.table("skills").select("id, name").eq("profile_id", profile_id).execute).data
     # Fetch projects
-    projects = supabase.table("projects").select("id, name, description, link").eq("profile_id", profile_id).execute().data
+    projects = supabase_reads.call(supabase.table("projects").select("id, name, description, link").eq("profile_id", profile_id).execute).data
     # Fetch work experiences
-    experiences = supabase.table("work_experiences").select("id, position, company, duration, description").eq("profile_id", profile_id).execute().data
+    experiences = supabase_reads.call(supabase.table("work_experiences").select("id, position, company, duration, description").eq("profile_id", profile_id).execute).data
     # Fetch education
-    education = supabase.table("education").select("id, degree, institution, year").eq("profile_id", profile_id).execute().data
+    education = supabase_reads.call(supabase.table("education").select("id, degree, institution, year").eq("profile_id", profile_id).execute).data
     # Fetch links
-    links = supabase.table("links").select("id, url").eq("profile_id", profile_id).execute().data
+    links = supabase_reads.call(supabase.table("links").select("id, url").eq("profile_id", profile_id).execute).data
 
     return {
         "profile_id": profile_id,
@@ -223,7 +759,7 @@ def fetch_profile_from_supabase(clerk_user_id: str) -> dict:
 
 MATCH_PROMPT_TEMPLATE = """
 You're an expert resume matcher. Here's a user's profile:
-
+{format_note}
 Skills:
 {skills}
 
@@ -236,134 +772,267 @@ Work Experience:
 Job Description:
 {job_description}
 
-Return a JSON object with:
-- job_title: the job title (if available)
-- job_company: the company name (if available)
-- job_raw_description: the full job description text, with newlines separated by \\n
+Return a JSON object with these keys, in this order:
 - matched_skill_ids: list of skill ids that best match
 - matched_project_ids: list of project ids that best match
 - matched_experience_ids: list of experience ids that best match
-- improved_descriptions: {{ id: updated_description }} for projects and experiences these should follow the XYZ format: What was done , what it achieved , how it was done . Be concise and concrete but natural and conversational. and newlines should be separated by \\n.
+- improved_descriptions: an updated description (with its id) for each matched project and experience, these should follow the XYZ format: What was done , what it achieved , how it was done . Be concise and concrete but natural and conversational. and newlines should be separated by \\n.
+- job_title: the job title (if available)
+- job_company: the company name (if available)
+- job_raw_description: the full job description text, with newlines separated by \\n
 
 Ensure this would be the best combination of skills, projects, and experiences for the user to match the job description and company.
 
 Only return valid JSON. No explanations or markdown.
 """
 
-def build_gemini_prompt(profile: dict, job_description: str) -> str:
+# Serialization of profile items in the match prompt, see prompt_encoding.py
+PROMPT_ENCODING = os.getenv("PROMPT_ENCODING", "json")
+if PROMPT_ENCODING not in PROMPT_ENCODINGS:
+    raise ValueError(f"PROMPT_ENCODING must be one of {PROMPT_ENCODINGS}, got {PROMPT_ENCODING!r}")
+prompt_token_accounting = TokenAccounting()
+gemini_match_latency = {encoding: LatencyRecorder() for encoding in PROMPT_ENCODINGS}
+
+def build_gemini_prompt(profile: dict, job_description: str, encoding: str = None) -> str:
+    encoding = encoding or PROMPT_ENCODING
     return MATCH_PROMPT_TEMPLATE.format(
-        skills=json.dumps(profile["skills"], indent=2),
-        projects=json.dumps(profile["projects"], indent=2),
-        experiences=json.dumps(profile["experiences"], indent=2),
+        format_note=format_note(encoding),
+        skills=encode_items(profile["skills"], encoding),
+        projects=encode_items(profile["projects"], encoding),
+        experiences=encode_items(profile["experiences"], encoding),
         job_description=job_description
     )
 
-def send_to_gemini(prompt: str) -> dict:
-    client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+# Extra generations allowed when a structured response fails validation even after local repair
+STRUCTURED_OUTPUT_RETRIES = int(os.getenv("STRUCTURED_OUTPUT_RETRIES", "1"))
+structured_output_stats = StructuredOutputStats()
 
-    response = client.models.generate_content(
-        model="gemini-2.0-flash",  # Use flash for speed if preferred
-        contents=prompt
-    )
+def structured_output_config(response_model) -> dict:
+    return {"response_mime_type": "application/json", "response_schema": response_model}
 
-    try:
-        print(response.text)
-        return json.loads(clean_and_parse_gemini_output(response.text))
-    except json.JSONDecodeError:
-        return {"error": "Invalid Gemini response", "raw_output": response.text}
+def send_to_gemini(prompt: str, encoding: str = None, on_field=None) -> dict:
+    from schemas import MatchResult
+    client = get_gemini_client()
+    encoding = encoding or PROMPT_ENCODING
 
-def save_profile_to_supabase(profile_data: dict, clerk_id: str):
-    # 1. Check if user already exists
-    existing = supabase.table("user_profiles").select("*").eq("clerk_user_id", clerk_id).maybe_single().execute()
+    for attempt in range(STRUCTURED_OUTPUT_RETRIES + 1):
+        # Retries are not streamed, so a failed attempt can't trigger more early writes
+        response_text = generate_match_text(client, prompt, encoding, on_field if attempt == 0 else None)
+        print(response_text)
+        result = parse_structured_attempt("match", response_text, MatchResult, attempt)
+        if result is not None:
+            return result.to_response()
 
-    if existing and existing.data:
-        profile_id = existing.data["clerk_user_id"]
-        supabase.table("user_profiles").update({
-            "name": profile_data.get("name"),
-            "email": profile_data.get("email"),
-            "phone": profile_data.get("phone")
-        }).eq("clerk_user_id", clerk_id).execute()
+    structured_output_stats.record("match", "failed")
+    return {"error": "Invalid Gemini response", "raw_output": response_text}
+
+# Validate one structured-output attempt and record its outcome. Returns the
+# model instance, or None when the caller should try again.
+def parse_structured_attempt(call: str, response_text: str, response_model, attempt: int):
+    from pydantic import ValidationError
+    from schemas import parse_model_output
+    try:
+        result, repaired = parse_model_output(response_text, response_model)
+    except ValidationError as e:
+        print(f"Gemini {call} output failed validation:", e)
+        return None
+    structured_output_stats.record(call, "retried" if attempt else "repaired" if repaired else "ok")
+    return result
+
+def generate_match_text(client, prompt: str, encoding: str, on_field=None) -> str:
+    estimated_tokens = prompt_token_accounting.record_prompt(encoding, prompt)
+    if on_field is None:
+        response = gemini_calls.call(generate_match_response, client, prompt, encoding, slot="match")
+        response_text = response.text or ""
     else:
-        profile_resp = supabase.table("user_profiles").insert({
-            "clerk_user_id": clerk_id,
-            "name": profile_data.get("name"),
-            "email": profile_data.get("email"),
-            "phone": profile_data.get("phone")
-        }).execute()
-        profile_id = clerk_id
+        # Never hedged: a second stream would report every field twice
+        response, response_text = gemini_calls.call(stream_match_response, client, prompt, encoding, on_field, hedge=False, slot="match")
+    record_match_usage(prompt, encoding, estimated_tokens, response)
+    return response_text
 
-    # Insert skills (ignore duplicates)
-    for skill in profile_data.get("skills", []):
-        try:
-            supabase.table("skills").insert({
-                "name": skill,
-                "profile_id": profile_id
-            }).execute()
-        except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass  # Ignore duplicate
-            else:
-                raise
+# One match generation, retried by gemini_calls
+def generate_match_response(client, prompt: str, encoding: str):
+    from schemas import MatchResult
+    with gemini_match_latency[encoding].time():
+        return client.models.generate_content(
+            model="gemini-2.0-flash",  # Use flash for speed if preferred
+            contents=prompt,
+            config=structured_output_config(MatchResult)
+        )
 
-    # Insert projects (ignore duplicates)
-    for proj in profile_data.get("projects", []):
-        try:
-            supabase.table("projects").insert({
+# Streaming: report each top-level field as soon as it is complete
+def stream_match_response(client, prompt: str, encoding: str, on_field):
+    from schemas import MatchResult
+    with gemini_match_latency[encoding].time():
+        parser = IncrementalObjectParser()
+        chunks = []
+        response = None
+        for response in client.models.generate_content_stream(
+            model="gemini-2.0-flash",
+            contents=prompt,
+            config=structured_output_config(MatchResult)
+        ):
+            chunk_text = response.text or ""
+            chunks.append(chunk_text)
+            for key, value in parser.feed(chunk_text):
+                on_field(key, value)
+    return response, "".join(chunks)
+
+def record_match_usage(prompt: str, encoding: str, estimated_tokens: int, response):
+    usage = getattr(response, "usage_metadata", None)
+    reported_tokens = getattr(usage, "prompt_token_count", None)
+    if reported_tokens:
+        prompt_token_accounting.record_reported(encoding, reported_tokens)
+    print(f"Match prompt: encoding={encoding} chars={len(prompt)} "
+          f"estimated_tokens={estimated_tokens} reported_tokens={reported_tokens}")
+
+# Unique constraints used as upsert conflict targets, the same ones the
+# Next.js manual-entry save uses. work_experiences and links have no unique
+# index to name (PostgREST rejects the upsert with 42P10), so they keep the
+# plain insert that skips duplicate-key errors.
+PROFILE_CONFLICT_TARGETS = {
+    "skills": "profile_id,name",
+    "projects": "profile_id,name,description",
+    "education": "profile_id,degree,institution,year",
+}
+
+def profile_child_rows(profile_data: dict, profile_id: str) -> dict:
+    return {
+        "skills": [
+            {"name": skill, "profile_id": profile_id}
+            for skill in profile_data.get("skills", [])
+        ],
+        "projects": [
+            {
                 "name": proj.get("name"),
                 "description": proj.get("description"),
                 "link": proj.get("link"),
                 "profile_id": profile_id
-            }).execute()
-        except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass
-            else:
-                raise
-
-    # Insert work experiences (ignore duplicates)
-    for exp in profile_data.get("work_experience", []):
-        try:
-            supabase.table("work_experiences").insert({
+            }
+            for proj in profile_data.get("projects", [])
+        ],
+        "work_experiences": [
+            {
                 "position": exp.get("position"),
                 "company": exp.get("company"),
                 "duration": exp.get("duration"),
                 "description": exp.get("description"),
                 "profile_id": profile_id
-            }).execute()
-        except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass
-            else:
-                raise
-
-    # Insert education (ignore duplicates)
-    for edu in profile_data.get("education", []):
-        try:
-            supabase.table("education").insert({
+            }
+            for exp in profile_data.get("work_experience", [])
+        ],
+        "education": [
+            {
                 "degree": edu.get("degree"),
                 "institution": edu.get("institution"),
                 "year": edu.get("year"),
                 "profile_id": profile_id
-            }).execute()
-        except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass
-            else:
-                raise
+            }
+            for edu in profile_data.get("education", [])
+        ],
+        "links": [
+            {"url": url, "profile_id": profile_id}
+            for url in profile_data.get("links", [])
+        ],
+    }
+
+# Insert rows in one request, skipping any that hit the conflict target.
+# Returns (inserted, duplicates) counted from the response rows.
+def bulk_upsert_ignore_duplicates(supabase, table: str, rows: list, on_conflict: str):
+    inserted = len(upsert_new_rows(supabase, table, rows, on_conflict))
+    return inserted, len(rows) - inserted
+
+# The same upsert, returning the rows it inserted (existing ones aren't returned)
+def upsert_new_rows(supabase, table: str, rows: list, on_conflict: str) -> list:
+    query = upsert_ignore_duplicates_query(supabase, table, rows, on_conflict)
+    if query is None:
+        return []
+    resp = supabase_writes.call(query.execute)
+    return resp.data or []
+
+# The ON CONFLICT DO NOTHING upsert for `rows`, or None when there is nothing to write
+def upsert_ignore_duplicates_query(supabase, table: str, rows: list, on_conflict: str):
+    unique_rows = unique_conflict_rows(rows, on_conflict)
+    if not unique_rows:
+        return None
+    return supabase.table(table).upsert(unique_rows, on_conflict=on_conflict, ignore_duplicates=True)
+
+def is_duplicate_key_error(e: Exception) -> bool:
+    return getattr(e, "code", None) == "23505" or "duplicate key value violates unique constraint" in str(e)
 
-    # Insert links (ignore duplicates)
-    for url in profile_data.get("links", []):
+# For tables without a conflict target: insert all rows in one request and,
+# if any of them is a duplicate, fall back to one insert per row so the
+# rest still go in. Returns (inserted, duplicates).
+def bulk_insert_ignore_duplicates(supabase, table: str, rows: list):
+    try:
+        resp = supabase_inserts.call(supabase.table(table).insert(rows).execute)
+        return len(resp.data or []), 0
+    except Exception as e:
+        if not is_duplicate_key_error(e):
+            raise
+    inserted = 0
+    for row in rows:
         try:
-            supabase.table("links").insert({
-                "url": url,
-                "profile_id": profile_id
-            }).execute()
+            supabase_inserts.call(supabase.table(table).insert(row).execute)
+            inserted += 1
         except Exception as e:
-            if "duplicate key value violates unique constraint" in str(e):
-                pass
-            else:
+            if not is_duplicate_key_error(e):
                 raise
-    print("Profile saved for user:", clerk_id)
+    return inserted, len(rows) - inserted
+
+def save_child_rows(supabase, table: str, rows: list):
+    if table in PROFILE_CONFLICT_TARGETS:
+        return bulk_upsert_ignore_duplicates(supabase, table, rows, PROFILE_CONFLICT_TARGETS[table])
+    return bulk_insert_ignore_duplicates(supabase, table, rows)
+
+# One row per conflict-target key, so a single upsert never hits the same key twice
+def unique_conflict_rows(rows: list, on_conflict: str) -> list:
+    key_columns = on_conflict.split(",")
+    return list({tuple(row.get(col) for col in key_columns): row for row in rows}.values())
+
+def save_profile_to_supabase(profile_data: dict, clerk_id: str):
+    summary = save_profiles_to_supabase([(clerk_id, profile_data)])
+    print("Profile saved for user:", clerk_id, summary)
+    return summary
+
+# Save several users' profiles with the same six requests as one:
+# `profiles` is a list of (clerk_id, profile_data) pairs.
+def save_profiles_to_supabase(profiles: list) -> dict:
+    supabase = get_supabase_client()
+    # 1. Create or update the profile rows (one row per user, last one wins)
+    profile_rows = profile_rows_by_user(profiles)
+    supabase_writes.call(supabase.table("user_profiles").upsert(list(profile_rows.values()), on_conflict="clerk_user_id").execute)
+
+    # 2. One bulk write per child table (at most six requests in total, unless
+    # a table without a conflict target has duplicates)
+    rows_by_table = child_rows_by_table(profiles)
+    summary = {}
+    for table, rows in rows_by_table.items():
+        if not rows:
+            continue
+        inserted, duplicates = save_child_rows(supabase, table, rows)
+        summary[table] = {"inserted": inserted, "duplicates": duplicates}
+    for clerk_id in profile_rows:
+        profile_snapshot_cache.bump(clerk_id)
+    return summary
+
+def profile_rows_by_user(profiles: list) -> dict:
+    return {
+        clerk_id: {
+            "clerk_user_id": clerk_id,
+            "name": profile_data.get("name"),
+            "email": profile_data.get("email"),
+            "phone": profile_data.get("phone")
+        }
+        for clerk_id, profile_data in profiles
+    }
+
+def child_rows_by_table(profiles: list) -> dict:
+    rows_by_table = {}
+    for clerk_id, profile_data in profiles:
+        for table, rows in profile_child_rows(profile_data, clerk_id).items():
+            rows_by_table.setdefault(table, []).extend(rows)
+    return rows_by_table
 
 GEMINI_PROMPT_TEMPLATE = """
 You are a resume analysis expert. Given the following raw resume text, extract structured information in JSON format with the following fields:
@@ -384,40 +1053,124 @@ Here is the resume text:
 """
 
 def extract_profile_with_gemini(resume_text: str, gemini_api_key: str) -> dict:
-    client = genai.Client(api_key=gemini_api_key)
+    from schemas import ExtractedProfile
+    client = get_gemini_client(gemini_api_key)
 
     prompt = GEMINI_PROMPT_TEMPLATE.format(resume_text=resume_text)
 
-    response = client.models.generate_content(
-    model="gemini-2.0-flash",
-    contents=prompt
-)
+    for attempt in range(STRUCTURED_OUTPUT_RETRIES + 1):
+        response = gemini_calls.call(generate_profile_response, client, prompt, slot="profile")
+        profile = parse_structured_attempt("profile", response.text or "", ExtractedProfile, attempt)
+        if profile is None:
+            print("Raw output:\n", response.text)
+            continue
+        return profile.model_dump()
 
+    structured_output_stats.record("profile", "failed")
+    return {}
 
+def generate_profile_response(client, prompt: str):
+    from schemas import ExtractedProfile
+    return client.models.generate_content(
+        model="gemini-2.0-flash",
+        contents=prompt,
+        config=structured_output_config(ExtractedProfile)
+    )
+
+# Coroutine versions of the match pipeline for /match-jobs, run on the
+# process-wide AsyncRuntime loop with client.aio and the async Supabase
+# client. CPU work (prefiltering, offline matching, output parsing, the
+# SQLite-backed caches) goes to the loop's default executor so it never
+# stalls other jobs' I/O.
+BATCH_MATCH_TIMEOUT = float(os.getenv("BATCH_MATCH_TIMEOUT", "300"))
+
+def run_blocking(fn, *args):
+    return asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+# Match one batch job and write its rows before reporting it, so a client
+# that disconnects mid-stream doesn't lose the jobs that already finished.
+# Returns (result line, {table: (inserted, duplicates)}) and never raises:
+# failures become that job's {"error"} line.
+async def match_batch_job(semaphore, job, user_id: str, profile: dict, engine: str, force: bool):
+    job_id = job['job_id']
     try:
-        cleaned_response = clean_and_parse_gemini_output(response.text)
-        return json.loads(cleaned_response)
-    except json.JSONDecodeError:
-        print("Failed to parse Gemini output as JSON")
-        print("Raw output:\n", response.text)
-        return {}
-    
-def clean_and_parse_gemini_output(raw_text: str) -> dict:
-    lines = raw_text.strip().splitlines()
-
-    # Remove first and last lines if they are triple quotes
-    if lines[0].strip() == '```json' and lines[-1].strip() == '```':
-        lines = lines[1:-1]
-
-    cleaned = "\n".join(lines)
-    try:
-        return cleaned
-    except json.JSONDecodeError:
-        print("Failed to parse cleaned Gemini output as JSON")
-        print("Cleaned string:\n", cleaned)
-        return {}   
+        async with semaphore:
+            supabase = await get_async_supabase_client()
+            response = await run_match_async(profile, job['job_description'], engine, force)
+            if "error" in response:
+                return {"job_id": job_id, "error": response["error"]}, {}
+            if not await update_job_description_async(supabase, job_id, user_id, response, job['job_description']):
+                return {"job_id": job_id, "error": "Failed to update job description"}, {}
+            written = await asyncio.gather(*(
+                write_match_table_async(supabase, spec, job_id, profile, response) for spec in MATCH_TABLES
+            ))
+    except Overloaded as e:
+        print("Batch match shed for job:", job_id, e)
+        return {"job_id": job_id, "error": "Service overloaded, retry shortly"}, {}
+    except Exception as e:
+        print("Batch match failed for job:", job_id, e)
+        return {"job_id": job_id, "error": "Match failed"}, {}
+    result = {"job_id": job_id}
+    counts = {}
+    for spec, (ids, count) in zip(MATCH_TABLES, written):
+        result[spec[3]] = ids
+        if count is not None:
+            counts[spec[0]] = count
+    return result, counts
+
+async def run_match_async(profile: dict, job_description: str, engine: str, force: bool = False) -> dict:
+    with match_engine_latency[engine].time():
+        result, cache_key, prompt = await run_blocking(prepare_match, profile, job_description, engine, force)
+        if result is not None:
+            return result
+        gemini_response = await send_to_gemini_async(prompt)
+        await run_blocking(store_match, cache_key, gemini_response)
+        return gemini_response
+
+async def send_to_gemini_async(prompt: str, encoding: str = None) -> dict:
+    from schemas import MatchResult
+    client = get_gemini_client()
+    encoding = encoding or PROMPT_ENCODING
+
+    for attempt in range(STRUCTURED_OUTPUT_RETRIES + 1):
+        estimated_tokens = prompt_token_accounting.record_prompt(encoding, prompt)
+        response = await gemini_calls.call_async(generate_match_response_async, client, prompt, encoding, slot="match")
+        record_match_usage(prompt, encoding, estimated_tokens, response)
+        response_text = response.text or ""
+        result = await run_blocking(parse_structured_attempt, "match", response_text, MatchResult, attempt)
+        if result is not None:
+            return result.to_response()
+
+    structured_output_stats.record("match", "failed")
+    return {"error": "Invalid Gemini response", "raw_output": response_text}
+
+async def generate_match_response_async(client, prompt: str, encoding: str):
+    from schemas import MatchResult
+    with gemini_match_latency[encoding].time():
+        return await client.aio.models.generate_content(
+            model="gemini-2.0-flash",
+            contents=prompt,
+            config=structured_output_config(MatchResult)
+        )
+
+async def update_job_description_async(supabase, job_id, user_id: str, gemini_response: dict, job_description: str) -> bool:
+    job_update = await supabase_writes.call_async(job_update_query(supabase, job_id, user_id, gemini_response, job_description).execute)
+    return bool(job_update.data)
 
+# (matched ids, (inserted, duplicates)); no counts when there was nothing to write
+async def write_match_table_async(supabase, spec, job_id, profile: dict, response: dict):
+    table, on_conflict = spec[0], spec[1]
+    ids, rows = build_match_rows(spec, job_id, profile, response)
+    if not rows:
+        return ids, None
+    query = upsert_ignore_duplicates_query(supabase, table, rows, on_conflict)
+    if query is None:
+        return ids, (0, len(rows))
+    resp = await supabase_writes.call_async(query.execute)
+    inserted = len(resp.data or [])
+    return ids, (inserted, len(rows) - inserted)
 
 
+# Local development only (reloader + debugger); run serve.py in production
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,44 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+
+class AsyncRuntime:
+    """One asyncio event loop per process, running in a background thread.
+
+    The async Gemini, Supabase and JWKS clients are bound to this loop, so
+    their connection pools are shared by every request. Request threads hand
+    coroutines over with `run()` and just wait on the result, while the loop
+    keeps any number of outbound calls in flight. `submit()` starts a
+    coroutine without waiting, for callers that fan out several at once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name="async-runtime", daemon=True)
+                thread.start()
+            return self._loop
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        # Cancelling the returned future cancels the coroutine
+        return asyncio.run_coroutine_threadsafe(coro, self.loop())
+
+    def run(self, coro, timeout: float = None):
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+runtime = AsyncRuntime()
@@ -0,0 +1,71 @@
+"""Measure how the lexical pre-filter shrinks match prompts.
+
+Usage:
+    python bench_prefilter.py --profile profile.json --jobs jobs/ [--encoding table]
+
+`profile.json` has the shape returned by fetch_profile_from_supabase; `--jobs`
+is a directory of .txt job descriptions (or individual files). Prints the
+estimated prompt tokens with and without the filter for each job, then how
+often each profile item was kept.
+"""
+import argparse
+import json
+import os
+from collections import Counter
+
+from app import build_gemini_prompt
+from prefilter import PREFILTER_TOP_K, prefilter_profile
+from prompt_encoding import PROMPT_ENCODINGS, estimate_tokens
+
+
+def load_jobs(paths: list) -> list:
+    jobs = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".txt"))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, encoding="utf-8") as f:
+                jobs.append((os.path.basename(file_path), f.read()))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", required=True)
+    parser.add_argument("--jobs", required=True, nargs="+")
+    parser.add_argument("--encoding", choices=PROMPT_ENCODINGS, default="json")
+    args = parser.parse_args()
+
+    with open(args.profile, encoding="utf-8") as f:
+        profile = json.load(f)
+    jobs = load_jobs(args.jobs)
+    if not jobs:
+        parser.error("no job descriptions found")
+
+    kept = Counter()
+    total_full = total_filtered = 0
+    print(f"top-K: {PREFILTER_TOP_K}  encoding: {args.encoding}\n")
+    print(f"{'job':<32} {'full':>8} {'filtered':>9} {'saved':>7}")
+    for name, job_description in jobs:
+        filtered = prefilter_profile(profile, job_description)
+        full_tokens = estimate_tokens(build_gemini_prompt(profile, job_description, args.encoding))
+        filtered_tokens = estimate_tokens(build_gemini_prompt(filtered, job_description, args.encoding))
+        total_full += full_tokens
+        total_filtered += filtered_tokens
+        for category in PREFILTER_TOP_K:
+            kept.update((category, item["id"]) for item in filtered[category])
+        print(f"{name[:32]:<32} {full_tokens:>8} {filtered_tokens:>9} {1 - filtered_tokens / full_tokens:>7.1%}")
+    print(f"{'TOTAL':<32} {total_full:>8} {total_filtered:>9} {1 - total_filtered / total_full:>7.1%}\n")
+
+    print("Keep rate per item:")
+    for category in PREFILTER_TOP_K:
+        for item in profile.get(category) or []:
+            label = item.get("name") or item.get("position") or ""
+            rate = kept[(category, item["id"])] / len(jobs)
+            print(f"  {category:<12} {str(item['id']):>6} {rate:>6.0%}  {label[:50]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+from limiter import Overloaded
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Overloaded):
+    """Raised without calling the dependency while its breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one dependency.
+
+    `failure_threshold` consecutive outage failures (as judged by
+    `is_failure`) open the breaker: calls then fail fast with CircuitOpen
+    for `reset_timeout` seconds. After that up to `half_open_calls` trial
+    calls go through; a success closes the breaker, a failure opens it
+    again. Errors that aren't outages (a 404, a validation error) count
+    as the dependency answering.
+    """
+
+    def __init__(self, name: str, is_failure, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_calls: int = 1):
+        self.name = name
+        self.is_failure = is_failure
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trials = 0
+        self.opens = 0
+        self.rejected = 0
+        self.failures = 0
+        self.successes = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, is_failure, **defaults) -> "CircuitBreaker":
+        """<PREFIX>_BREAKER_FAILURES and <PREFIX>_BREAKER_RESET_SECONDS override the defaults."""
+        if os.getenv(f"{prefix}_BREAKER_FAILURES"):
+            defaults["failure_threshold"] = int(os.getenv(f"{prefix}_BREAKER_FAILURES"))
+        if os.getenv(f"{prefix}_BREAKER_RESET_SECONDS"):
+            defaults["reset_timeout"] = float(os.getenv(f"{prefix}_BREAKER_RESET_SECONDS"))
+        return cls(name, is_failure, **defaults)
+
+    def _retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self):
+        """Raise CircuitOpen, or admit the call; every admitted call must be
+        followed by `after_call`."""
+        with self._lock:
+            if self.state == OPEN:
+                if self._retry_in() > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(f"{self.name} circuit open", retry_after=self._retry_in())
+                self.state = HALF_OPEN
+                self.trials = 0
+            if self.state == HALF_OPEN:
+                if self.trials >= self.half_open_calls:
+                    self.rejected += 1
+                    raise CircuitOpen(f"{self.name} circuit half-open, trial in progress", retry_after=1.0)
+                self.trials += 1
+
+    def cancel_call(self):
+        # An admitted call that was cancelled: free its half-open trial without a verdict
+        with self._lock:
+            if self.state == HALF_OPEN and self.trials:
+                self.trials -= 1
+
+    def after_call(self, error: BaseException = None):
+        failed = error is not None and self.is_failure(error)
+        with self._lock:
+            if not failed:
+                self.successes += 1
+                self.consecutive_failures = 0
+                if self.state == HALF_OPEN:
+                    print(f"Circuit {self.name}: closed")
+                    self.state = CLOSED
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opens += 1
+                    print(f"Circuit {self.name}: open for {self.reset_timeout}s after {self.last_error}")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "retry_in_seconds": round(self._retry_in(), 1) if self.state == OPEN else None,
+                "opens": self.opens,
+                "rejected": self.rejected,
+                "failures": self.failures,
+                "successes": self.successes,
+                "last_error": self.last_error,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+            }
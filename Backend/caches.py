@@ -0,0 +1,274 @@
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional per-entry expiry.
+
+    Entries expire at an absolute wall-clock time (`expires_at`) or after
+    `ttl` seconds; the least recently used entry is evicted once
+    `max_entries` is reached, so memory stays bounded.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None, expires_at: float = None):
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class ThreadConnections:
+    """One SQLite connection per thread, kept open between calls.
+
+    `init(conn)` runs on the first connection of the process to create the
+    schema. A forked child opens its own connections.
+    """
+
+    def __init__(self, db_path: str, init=None):
+        self.db_path = db_path
+        self.init = init
+        # The database file and schema are created on first use, not at import
+        self._ready = False
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "conn", None) is None or local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                if self.init is not None:
+                    self.init(conn)
+                self._ready = True
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+
+class PersistentLRUCache(LRUCache):
+    """LRUCache backed by a SQLite file so entries survive restarts.
+
+    The in-memory LRU serves hot keys; misses fall through to the file and
+    are promoted back into memory. The file is capped at `max_entries` too,
+    dropping the rows least recently written or read from disk. Values must
+    be JSON-serializable.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 1024, ttl: float = None):
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.db_path = db_path
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self._connections = ThreadConnections(db_path, self._create_schema)
+
+    def _create_schema(self, conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries"
+            " (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cache_entries)")}
+        if "accessed_at" not in columns:
+            # Cache files created before the disk cap existed
+            try:
+                conn.execute("ALTER TABLE cache_entries ADD COLUMN accessed_at REAL")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):
+                    raise
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_expires_at ON cache_entries (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_accessed_at ON cache_entries (accessed_at)")
+
+    def _connection(self):
+        return self._connections.get()
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        if value is not default:
+            return value
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (str(key), now),
+        ).fetchone()
+        if row is None:
+            return default
+        # Memory hits don't touch the file, only reads that reach it do
+        conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, str(key)))
+        value = json.loads(row[0])
+        super().set(key, value, expires_at=row[1])
+        with self._lock:
+            self.disk_hits += 1
+        return value
+
+    def set(self, key, value, ttl: float = None, expires_at: float = None):
+        if expires_at is None:
+            ttl = self.ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        super().set(key, value, expires_at=expires_at)
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (str(key), json.dumps(value), expires_at, now),
+            )
+            conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            evicted = conn.execute(
+                "DELETE FROM cache_entries WHERE key IN"
+                " (SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if evicted:
+            with self._lock:
+                self.disk_evictions += evicted
+
+    def pop(self, key, default=None):
+        value = super().pop(key, default)
+        self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (str(key),))
+        return value
+
+    def clear(self):
+        super().clear()
+        self._connection().execute("DELETE FROM cache_entries")
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_evictions"] = self.disk_evictions
+        return stats
+
+
+class SharedVersions:
+    """Per-key version counters in a SQLite file, shared by every process
+    that opens the same file (web workers, resume job workers)."""
+
+    def __init__(self, db_path: str):
+        self._connections = ThreadConnections(db_path, self._create_schema)
+
+    def _create_schema(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS snapshot_versions (key TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def get(self, key) -> int:
+        row = self._connections.get().execute("SELECT version FROM snapshot_versions WHERE key = ?", (str(key),)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, key):
+        self._connections.get().execute(
+            "INSERT INTO snapshot_versions (key, version) VALUES (?, 1)"
+            " ON CONFLICT (key) DO UPDATE SET version = version + 1",
+            (str(key),),
+        )
+
+
+class VersionedSnapshotCache:
+    """Per-key snapshots that are only served while their version is current.
+
+    Readers take `version(key)` before loading, then store the snapshot with
+    that version. Writers call `bump(key)`, so a snapshot loaded before (or
+    during) a write is never served afterwards. Both maps are LRU-bounded.
+    Versions are per process unless `shared_versions` (a SharedVersions) is
+    given, in which case a bump in any process invalidates the snapshot
+    everywhere.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None, shared_versions=None):
+        self._snapshots = LRUCache(max_entries=max_entries, ttl=ttl)
+        self._versions = LRUCache(max_entries=max_entries * 4)
+        self._counter = itertools.count(1)
+        self.shared_versions = shared_versions
+        self.bumps = 0
+
+    def version(self, key) -> int:
+        if self.shared_versions is not None:
+            return self.shared_versions.get(key)
+        version = self._versions.get(key)
+        if version is None:
+            version = next(self._counter)
+            self._versions.set(key, version)
+        return version
+
+    def bump(self, key):
+        if self.shared_versions is not None:
+            self.shared_versions.bump(key)
+        else:
+            self._versions.set(key, next(self._counter))
+        self._snapshots.pop(key)
+        self.bumps += 1
+
+    def get(self, key, default=None):
+        entry = self._snapshots.get(key)
+        if entry is None:
+            return default
+        current = self.shared_versions.get(key) if self.shared_versions is not None else self._versions.get(key)
+        if entry[0] != current:
+            return default
+        return entry[1]
+
+    def set(self, key, version: int, value):
+        self._snapshots.set(key, (version, value))
+
+    def stats(self) -> dict:
+        stats = self._snapshots.stats()
+        stats["bumps"] = self.bumps
+        stats["shared_versions"] = self.shared_versions is not None
+        return stats
@@ -0,0 +1,183 @@
+import asyncio
+import importlib.util
+import os
+import threading
+
+# google.genai, supabase and httpx are imported when the first client is
+# built, so importing this module stays cheap.
+
+# Connection pool sizing shared by the Gemini and Supabase HTTP clients
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "50"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1" and importlib.util.find_spec("h2") is not None
+
+
+def _pool_limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _raise_for_outage(response):
+    # postgrest turns every error response into an APIError without the HTTP
+    # status, so retries and breakers couldn't tell a 503 from a bad query.
+    # Raising httpx.HTTPStatusError for 429 and 5xx keeps the status.
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+
+
+async def _raise_for_outage_async(response):
+    _raise_for_outage(response)
+
+
+class ClientRegistry:
+    """Creates the outbound Gemini and Supabase clients once per process.
+
+    Clients hold keep-alive connection pools, so reusing them skips the TLS
+    handshake on every call. The registry is keyed by pid: a forked worker
+    builds its own clients instead of sharing the parent's sockets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._clients = {}
+        self._http_clients = {}
+        self._requests = {}
+        # HTTP timeouts in seconds per dependency, set by app.py from its call
+        # policies, so the request behind an abandoned attempt gives up too
+        self.timeouts = {}
+
+    def _count_request(self, name: str):
+        def hook(request):
+            self._requests[name] = self._requests.get(name, 0) + 1
+        return hook
+
+    def _count_request_async(self, name: str):
+        async def hook(request):
+            self._requests[name] = self._requests.get(name, 0) + 1
+        return hook
+
+    def _get(self, key, factory):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._clients = {}
+                self._http_clients = {}
+                self._requests = {}
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = factory()
+            return client
+
+    def gemini(self, api_key: str = None):
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+
+        def build():
+            from google import genai
+            client = genai.Client(
+                api_key=api_key,
+                http_options={
+                    # GEMINI_BASE_URL points at a stand-in server (fake_services.py)
+                    "base_url": os.getenv("GEMINI_BASE_URL") or None,
+                    # genai takes milliseconds
+                    "timeout": int(self.timeouts["gemini"] * 1000) if self.timeouts.get("gemini") else None,
+                    "client_args": {
+                        "limits": _pool_limits(),
+                        "http2": HTTP2_ENABLED,
+                        "event_hooks": {"request": [self._count_request("gemini")]},
+                    },
+                    # Used by client.aio on the shared AsyncRuntime loop
+                    "async_client_args": {
+                        "limits": _pool_limits(),
+                        "http2": HTTP2_ENABLED,
+                        "event_hooks": {"request": [self._count_request_async("gemini_async")]},
+                    },
+                },
+            )
+            self._http_clients["gemini"] = client._api_client._httpx_client
+            self._http_clients["gemini_async"] = client._api_client._async_httpx_client
+            return client
+
+        return self._get(("gemini", api_key), build)
+
+    def supabase(self):
+        def build():
+            from postgrest.utils import SyncClient
+            from supabase import create_client
+            client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            # Swap the PostgREST session for one with our pool limits
+            session = client.postgrest.session
+            client.postgrest.session = SyncClient(
+                base_url=session.base_url,
+                headers=session.headers,
+                timeout=self.timeouts.get("supabase") or session.timeout,
+                follow_redirects=True,
+                http2=HTTP2_ENABLED,
+                limits=_pool_limits(),
+                event_hooks={"request": [self._count_request("supabase")], "response": [_raise_for_outage]},
+            )
+            session.close()
+            self._http_clients["supabase"] = client.postgrest.session
+            return client
+
+        return self._get("supabase", build)
+
+    async def supabase_async(self):
+        # Must be awaited on the AsyncRuntime loop: the async session is bound to it
+        async def build():
+            from postgrest.utils import AsyncClient
+            from supabase import acreate_client
+            client = await acreate_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            session = client.postgrest.session
+            client.postgrest.session = AsyncClient(
+                base_url=session.base_url,
+                headers=session.headers,
+                timeout=self.timeouts.get("supabase") or session.timeout,
+                follow_redirects=True,
+                http2=HTTP2_ENABLED,
+                limits=_pool_limits(),
+                event_hooks={
+                    "request": [self._count_request_async("supabase_async")],
+                    "response": [_raise_for_outage_async],
+                },
+            )
+            await session.aclose()
+            self._http_clients["supabase_async"] = client.postgrest.session
+            return client
+
+        # Concurrent first callers share one build task
+        return await self._get("supabase_async", lambda: asyncio.ensure_future(build()))
+
+    def pool_stats(self) -> dict:
+        stats = {}
+        for name, http_client in list(self._http_clients.items()):
+            connections = http_client._transport._pool.connections
+            stats[name] = {
+                "requests": self._requests.get(name, 0),
+                "connections": len(connections),
+                "idle": sum(1 for conn in connections if conn.is_idle()),
+                "max_connections": HTTP_POOL_MAX_CONNECTIONS,
+                "max_keepalive": HTTP_POOL_MAX_KEEPALIVE,
+                "http2": HTTP2_ENABLED,
+            }
+        return stats
+
+
+registry = ClientRegistry()
+
+
+def get_gemini_client(api_key: str = None):
+    return registry.gemini(api_key)
+
+
+def get_supabase_client():
+    return registry.supabase()
+
+
+async def get_async_supabase_client():
+    return await registry.supabase_async()
@@ -0,0 +1,353 @@
+"""Local stand-ins for Supabase (PostgREST), Gemini and the Clerk JWKS
+endpoint, with fault injection, for exercising the circuit breakers, retries
+and the Gemini limiter without any real service.
+
+Usage:
+    python fake_services.py                          # supabase :54321, gemini :54322, jwks :54323
+    python fake_services.py --fail-rate 0.3 --latency-ms 200
+
+Point the app at them:
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=fake.fake.fake \\
+    GEMINI_BASE_URL=http://127.0.0.1:54322 GEMINI_API_KEY=fake \\
+    CLERK_JWKS_URL=http://127.0.0.1:54323/.well-known/jwks.json python serve.py
+
+The JWKS stand-in serves the public half of a local RSA key (FAKE_JWKS_KEY,
+created on first use), so tokens from --mint or mint_token() pass the app's
+verification:
+    curl -H "Authorization: Bearer $(python fake_services.py --mint user_123)" ...
+
+Change a service's faults while it runs, then watch /status:
+    curl -X POST localhost:54322/_faults -d '{"down": true}'
+    curl -X POST localhost:54321/_faults -d '{"fail_rate": 0.5, "status": 503, "latency_ms": 1500}'
+    curl -X POST localhost:54321/_faults -d '{}'     # back to healthy
+    curl localhost:54321/_faults
+
+Faults: `latency_ms` delays every response, `fail_rate` answers that share
+of requests with `status` (default 503), `down` drops connections without
+answering. The PostgREST stand-in keeps rows in memory and understands
+eq/in filters, upserts with on_conflict and single-object reads; embedded
+selects return the parent rows only. Gemini answers with a fixed profile or
+an empty match that fits the requested schema.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+QUERY_PARAMS = {"select", "limit", "order", "offset", "on_conflict", "columns"}
+
+# Private key behind the fake JWKS (PEM), shared by the server and --mint
+FAKE_JWKS_KEY = os.getenv("FAKE_JWKS_KEY", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fake_jwks_key.pem"))
+FAKE_JWKS_KID = "fake-key-1"
+
+FAKE_PROFILE = {
+    "name": "Test User",
+    "email": "test@example.com",
+    "phone": "555-0100",
+    "skills": ["Python", "Flask", "PostgreSQL"],
+    "work_experience": [
+        {"position": "Backend Engineer", "company": "Example Co", "duration": "2021-2024",
+         "description": "Built APIs in Flask."},
+    ],
+    "education": [{"degree": "BSc Computer Science", "institution": "Example University", "year": "2021"}],
+    "projects": [{"name": "Resume matcher", "description": "Matches resumes to jobs.", "link": None}],
+    "links": ["https://github.com/example"],
+}
+
+FAKE_MATCH = {
+    "matched_skill_ids": [],
+    "matched_project_ids": [],
+    "matched_experience_ids": [],
+    "improved_descriptions": [],
+    "job_title": "Fake role",
+    "job_company": "Fake company",
+    "job_raw_description": "Stand-in job description",
+}
+
+
+class Faults:
+    def __init__(self, latency_ms: float = 0, fail_rate: float = 0, status: int = 503, down: bool = False):
+        self._lock = threading.Lock()
+        self.update({"latency_ms": latency_ms, "fail_rate": fail_rate, "status": status, "down": down})
+
+    def update(self, values: dict):
+        with self._lock:
+            self.latency_ms = float(values.get("latency_ms", 0))
+            self.fail_rate = float(values.get("fail_rate", 0))
+            self.status = int(values.get("status", 503))
+            self.down = bool(values.get("down", False))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"latency_ms": self.latency_ms, "fail_rate": self.fail_rate, "status": self.status, "down": self.down}
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    faults = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else None
+
+    def _send_json(self, status: int, payload, content_type: str = "application/json"):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        if url.path == "/_faults":
+            if method == "POST":
+                self.faults.update(self._body() or {})
+                print(f"{type(self).__name__}: faults now {self.faults.to_dict()}")
+            self._send_json(200, self.faults.to_dict())
+            return
+
+        faults = self.faults.to_dict()
+        if faults["latency_ms"]:
+            time.sleep(faults["latency_ms"] / 1000)
+        if faults["down"]:
+            # Hang up without a response, like a dead upstream behind a proxy
+            self.close_connection = True
+            return
+        if random.random() < faults["fail_rate"]:
+            self._body()
+            self._send_json(faults["status"], self.error_body(faults["status"]))
+            return
+        self.handle_request(method, url.path, dict(parse_qsl(url.query)))
+
+    def handle_request(self, method: str, path: str, params: dict):
+        self._send_json(404, {"message": "not found"})
+
+    def error_body(self, status: int) -> dict:
+        return {"message": "injected failure"}
+
+
+class FakePostgrest(FakeHandler):
+    tables = {}
+    lock = threading.Lock()
+    next_id = [1]
+
+    def error_body(self, status: int) -> dict:
+        # Like PostgREST's own errors, the body carries no HTTP status
+        return {"code": "PGRST000", "message": "injected failure", "details": None, "hint": None}
+
+    def _matches(self, row: dict, filters: dict) -> bool:
+        for column, expression in filters.items():
+            op, _, value = expression.partition(".")
+            current = "" if row.get(column) is None else str(row.get(column))
+            if op == "eq" and current != value:
+                return False
+            if op == "in" and current not in [v.strip().strip('"') for v in value.strip("()").split(",")]:
+                return False
+        return True
+
+    def handle_request(self, method: str, path: str, params: dict):
+        if not path.startswith("/rest/v1/"):
+            self._send_json(404, {"message": "not found"})
+            return
+        table = path[len("/rest/v1/"):]
+        filters = {key: value for key, value in params.items() if key not in QUERY_PARAMS}
+        body = self._body()
+        with self.lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "GET":
+                result = [row for row in rows if self._matches(row, filters)]
+                if params.get("limit"):
+                    result = result[:int(params["limit"])]
+            elif method == "POST":
+                result = self._upsert(rows, body if isinstance(body, list) else [body], params.get("on_conflict"))
+            elif method == "PATCH":
+                result = [row for row in rows if self._matches(row, filters)]
+                for row in result:
+                    row.update(body or {})
+            else:
+                result = [row for row in rows if self._matches(row, filters)]
+                self.tables[table] = [row for row in rows if row not in result]
+
+        if "vnd.pgrst.object" in (self.headers.get("Accept") or ""):
+            if len(result) != 1:
+                self._send_json(406, {
+                    "code": "PGRST116",
+                    "message": "JSON object requested, multiple (or no) rows returned",
+                    "details": f"The result contains {len(result)} rows",
+                    "hint": None,
+                })
+                return
+            self._send_json(200, result[0])
+            return
+        self._send_json(201 if method == "POST" else 200, result)
+
+    def _upsert(self, rows: list, new_rows: list, on_conflict: str) -> list:
+        ignore = "ignore-duplicates" in (self.headers.get("Prefer") or "")
+        key_columns = on_conflict.split(",") if on_conflict else []
+        written = []
+        for new_row in new_rows:
+            existing = None
+            if key_columns:
+                key = [str(new_row.get(col)) for col in key_columns]
+                existing = next((row for row in rows if [str(row.get(col)) for col in key_columns] == key), None)
+            if existing is not None:
+                if not ignore:
+                    existing.update(new_row)
+                    written.append(existing)
+                continue
+            row = dict(new_row)
+            if "id" not in row:
+                row["id"] = self.next_id[0]
+                self.next_id[0] += 1
+            rows.append(row)
+            written.append(row)
+        return written
+
+
+class FakeGemini(FakeHandler):
+    def error_body(self, status: int) -> dict:
+        return {"error": {"code": status, "message": "injected failure", "status": "UNAVAILABLE"}}
+
+    def handle_request(self, method: str, path: str, params: dict):
+        body = self._body() or {}
+        if not path.endswith((":generateContent", ":streamGenerateContent")):
+            self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+        # The response schema names the fields it wants; match calls ask for matched_*_ids
+        text = json.dumps(FAKE_MATCH if "matched_skill_ids" in json.dumps(body) else FAKE_PROFILE)
+        usage = {"promptTokenCount": len(json.dumps(body)) // 4, "candidatesTokenCount": len(text) // 4}
+
+        def chunk(part: str) -> dict:
+            return {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": part}]}, "index": 0}],
+                "usageMetadata": usage,
+            }
+
+        if path.endswith(":generateContent"):
+            self._send_json(200, chunk(text))
+            return
+        # Server-sent events, a few chunks per response
+        size = max(1, len(text) // 4)
+        events = "".join(f"data: {json.dumps(chunk(text[i:i + size]))}\r\n\r\n" for i in range(0, len(text), size))
+        payload = events.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeJWKS(FakeHandler):
+    jwks = {"keys": []}
+
+    def handle_request(self, method: str, path: str, params: dict):
+        if path.endswith("/jwks.json"):
+            self._send_json(200, self.jwks)
+        else:
+            self._send_json(404, {"message": "not found"})
+
+
+def signing_key(path: str = None):
+    """The fake RSA private key, generated and saved to `path` if missing."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    path = path or FAKE_JWKS_KEY
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return serialization.load_pem_private_key(f.read(), password=None)
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    with open(path, "wb") as f:
+        f.write(pem)
+    return key
+
+
+def fake_jwks(path: str = None) -> dict:
+    from jwt.algorithms import RSAAlgorithm
+    jwk = RSAAlgorithm.to_jwk(signing_key(path).public_key(), as_dict=True)
+    jwk.update(kid=FAKE_JWKS_KID, alg="RS256", use="sig")
+    return {"keys": [jwk]}
+
+
+def mint_token(sub: str, expires_in: float = 3600, audience: str = None, path: str = None, **claims) -> str:
+    """An RS256 token for `sub`, signed with the fake key, like a Clerk session token."""
+    import jwt
+    now = int(time.time())
+    payload = {"sub": sub, "iat": now, "nbf": now, "exp": now + int(expires_in), **claims}
+    if audience:
+        payload["aud"] = audience
+    return jwt.encode(payload, signing_key(path), algorithm="RS256", headers={"kid": FAKE_JWKS_KID})
+
+
+def serve(handler_class, name: str, host: str, port: int, faults: Faults) -> ThreadingHTTPServer:
+    handler = type(handler_class.__name__, (handler_class,), {"faults": faults})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=name, daemon=True).start()
+    print(f"{name} stand-in on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in Supabase, Gemini and JWKS servers with fault injection.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--supabase-port", type=int, default=54321)
+    parser.add_argument("--gemini-port", type=int, default=54322)
+    parser.add_argument("--jwks-port", type=int, default=54323)
+    parser.add_argument("--jwks-file", help="JWKS JSON to serve (default: the public half of FAKE_JWKS_KEY)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="initial latency for every service")
+    parser.add_argument("--fail-rate", type=float, default=0, help="initial failure rate for every service")
+    parser.add_argument("--status", type=int, default=503, help="status for injected failures")
+    parser.add_argument("--mint", metavar="SUB", help="print a token for SUB signed with the fake key, then exit")
+    parser.add_argument("--audience", default=os.getenv("CLERK_CLIENT_ID"), help="aud claim for --mint")
+    args = parser.parse_args()
+
+    if args.mint:
+        print(mint_token(args.mint, audience=args.audience))
+        return
+
+    if args.jwks_file:
+        with open(args.jwks_file, encoding="utf-8") as f:
+            FakeJWKS.jwks = json.load(f)
+    else:
+        FakeJWKS.jwks = fake_jwks()
+
+    def initial_faults():
+        return Faults(latency_ms=args.latency_ms, fail_rate=args.fail_rate, status=args.status)
+
+    servers = [
+        serve(FakePostgrest, "supabase", args.host, args.supabase_port, initial_faults()),
+        serve(FakeGemini, "gemini", args.host, args.gemini_port, initial_faults()),
+        serve(FakeJWKS, "jwks", args.host, args.jwks_port, initial_faults()),
+    ]
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
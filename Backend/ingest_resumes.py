@@ -0,0 +1,149 @@
+"""Bulk-load resumes through the /upload pipeline without going through HTTP.
+
+Usage:
+    python ingest_resumes.py --dir cohort/            # files named <clerk_user_id>.pdf
+    python ingest_resumes.py --manifest cohort.csv    # rows of user_id,pdf_path
+
+PDF text extraction runs in a process pool, Gemini extraction is capped at
+--llm-concurrency calls in flight, and profiles are saved --save-batch users
+at a time. Users saved so far are appended to --checkpoint, so re-running
+the same command skips them and resumes where it stopped.
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from app import extract_profile_with_gemini, save_profiles_to_supabase
+from pdf_ingest import extract_pdf_text
+
+
+def load_manifest(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [row for row in csv.reader(f) if row and not row[0].startswith("#")]
+    if rows and rows[0][:2] == ["user_id", "pdf_path"]:
+        rows = rows[1:]
+    base = os.path.dirname(os.path.abspath(path))
+    return [(user_id.strip(), os.path.join(base, pdf_path.strip())) for user_id, pdf_path in rows]
+
+
+def scan_directory(path: str) -> list:
+    return [
+        (os.path.splitext(name)[0], os.path.join(path, name))
+        for name in sorted(os.listdir(path))
+        if name.lower().endswith(".pdf")
+    ]
+
+
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+# Runs in a pool worker; the pool already spreads files across cores, so the
+# per-document page pool stays off.
+def extract_file_text(pdf_path: str):
+    page_timings = []
+    with open(pdf_path, "rb") as f:
+        text = extract_pdf_text(f, page_timings, parallel=False)
+    return text, len(page_timings)
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.monotonic()
+        self.pages = 0
+        self.extracted = 0
+        self.profiled = 0
+        self.saved = 0
+        self.failed = 0
+
+    def line(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.saved / elapsed if elapsed else 0.0
+        return (
+            f"[{elapsed:7.1f}s] text {self.extracted}/{self.total}  llm {self.profiled}  "
+            f"saved {self.saved}  failed {self.failed}  pages {self.pages}  "
+            f"{rate:.2f} resumes/s ({rate * 3600:.0f}/h)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load resumes through the upload pipeline.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="directory of <clerk_user_id>.pdf files")
+    source.add_argument("--manifest", help="CSV of user_id,pdf_path rows")
+    parser.add_argument("--checkpoint", default="ingest_checkpoint.txt")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="PDF extraction processes")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Gemini calls in flight")
+    parser.add_argument("--save-batch", type=int, default=20, help="users per bulk save")
+    args = parser.parse_args()
+
+    entries = load_manifest(args.manifest) if args.manifest else scan_directory(args.dir)
+    done = load_checkpoint(args.checkpoint)
+    todo = [(user_id, path) for user_id, path in entries if user_id not in done]
+    print(f"{len(entries)} resumes, {len(entries) - len(todo)} already done, {len(todo)} to go")
+    if not todo:
+        return
+
+    progress = Progress(len(todo))
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    pending = []
+
+    def flush(checkpoint):
+        if not pending:
+            return
+        save_profiles_to_supabase(pending)
+        checkpoint.writelines(f"{user_id}\n" for user_id, _ in pending)
+        checkpoint.flush()
+        progress.saved += len(pending)
+        pending.clear()
+        print(progress.line())
+
+    with open(args.checkpoint, "a", encoding="utf-8") as checkpoint, \
+            ProcessPoolExecutor(max_workers=args.workers) as cpu_pool, \
+            ThreadPoolExecutor(max_workers=args.llm_concurrency) as llm_pool:
+        text_futures = {cpu_pool.submit(extract_file_text, path): (user_id, path) for user_id, path in todo}
+        llm_futures = {}
+        # One loop over both stages: each document goes to the LLM pool as soon
+        # as its text is ready, and profiles are saved as soon as a batch fills
+        while text_futures or llm_futures:
+            done, _ = wait([*text_futures, *llm_futures], return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in text_futures:
+                    user_id, path = text_futures.pop(future)
+                    try:
+                        text, pages = future.result()
+                    except Exception as e:
+                        progress.failed += 1
+                        print(f"PDF extraction failed for {user_id} ({path}): {e}")
+                        continue
+                    progress.extracted += 1
+                    progress.pages += pages
+                    llm_futures[llm_pool.submit(extract_profile_with_gemini, text, gemini_api_key)] = user_id
+                    continue
+
+                user_id = llm_futures.pop(future)
+                try:
+                    profile = future.result()
+                except Exception as e:
+                    profile = None
+                    print(f"Profile extraction failed for {user_id}: {e}")
+                if not profile:
+                    progress.failed += 1
+                    continue
+                progress.profiled += 1
+                pending.append((user_id, profile))
+                if len(pending) >= args.save_batch:
+                    flush(checkpoint)
+        flush(checkpoint)
+
+    print("Done.", progress.line())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import concurrent.futures
+import threading
+import time
+
+from breakers import CircuitOpen
+
+# jwt (and the cryptography backend it loads) and requests are
+# imported on first use, keeping them out of process startup.
+
+
+class JWKSCache:
+    """Process-wide store of the Clerk signing keys, indexed by `kid`.
+
+    Keys are fetched once and reused. An unknown `kid` triggers a refetch
+    (key rotation), but never more often than `min_refresh_interval`
+    seconds. One fetch runs at a time: callers that miss meanwhile wait for
+    it, while lookups of known keys never do. If a refresh fails the last
+    good key set is kept; with a `breaker`, refreshes are skipped while the
+    JWKS endpoint is down.
+    """
+
+    def __init__(self, jwks_url: str, min_refresh_interval: float = 60.0, timeout: float = 5.0, breaker=None):
+        self.jwks_url = jwks_url
+        self.breaker = breaker
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self._keys = {}
+        self._last_fetch = None
+        # The refresh in progress, if any; callers that miss meanwhile wait on it
+        self._refresh = None
+        # Guards counters and refresh bookkeeping only, never held across a fetch
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _fetch_keys(self) -> dict:
+        import jwt
+        import requests
+        resp = requests.get(self.jwks_url, timeout=self.timeout)
+        resp.raise_for_status()
+        jwk_set = jwt.PyJWKSet.from_dict(resp.json())
+        return {key.key_id: key for key in jwk_set.keys}
+
+    def _begin_refresh(self, force: bool):
+        # (future, owner): the refresh in progress to wait for, or a new one
+        # the caller has to run. (None, False) when keys were fetched too recently.
+        with self._lock:
+            if self._refresh is not None:
+                return self._refresh, False
+            now = time.monotonic()
+            if not force and self._last_fetch is not None and now - self._last_fetch < self.min_refresh_interval:
+                return None, False
+            self._last_fetch = now
+            self._refresh = concurrent.futures.Future()
+            return self._refresh, True
+
+    def _end_refresh(self, keys: dict = None, failed: bool = False) -> bool:
+        with self._lock:
+            future, self._refresh = self._refresh, None
+            if keys is not None:
+                self._keys = keys
+                self.refreshes += 1
+            elif failed:
+                self.refresh_failures += 1
+        future.set_result(keys is not None)
+        return keys is not None
+
+    def refresh(self, force: bool = False) -> bool:
+        future, owner = self._begin_refresh(force)
+        if not owner:
+            return future.result() if future is not None else False
+        keys = None
+        failed = False
+        try:
+            if self._admit():
+                try:
+                    keys = self._fetch_keys()
+                except Exception as e:
+                    failed = True
+                    self._record(e)
+                    print("JWKS refresh failed, keeping last good keys:", e)
+                else:
+                    self._record()
+        finally:
+            refreshed = self._end_refresh(keys, failed)
+        return refreshed
+
+    def _admit(self) -> bool:
+        if self.breaker is None:
+            return True
+        try:
+            self.breaker.before_call()
+            return True
+        except CircuitOpen as e:
+            print("JWKS refresh skipped:", e)
+            return False
+
+    def _record(self, error: Exception = None):
+        if self.breaker is not None:
+            self.breaker.after_call(error)
+
+    def get_signing_key(self, kid: str):
+        import jwt
+        key = self._keys.get(kid)
+        if key is not None:
+            with self._lock:
+                self.hits += 1
+            return key
+
+        with self._lock:
+            self.misses += 1
+        self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise jwt.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return key
+
+    def get_signing_key_from_jwt(self, token: str):
+        import jwt
+        header = jwt.get_unverified_header(token)
+        return self.get_signing_key(header.get("kid"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "keys": len(self._keys),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+            }
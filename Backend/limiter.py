@@ -0,0 +1,206 @@
+import asyncio
+import contextlib
+import threading
+import time
+from collections import deque
+
+from metrics import LatencyRecorder
+
+# HTTP statuses that mean "slow down" rather than "this request is bad"
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+class Overloaded(Exception):
+    """The dependency is shedding load: it answered 429/503 or timed out,
+    or no slot freed up before the caller's queue deadline."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueTimeout(Overloaded):
+    pass
+
+
+def error_status(exc: BaseException):
+    """HTTP status behind an SDK error, if known. Duck-typed so the SDK
+    modules don't have to be imported here: google.genai APIError has an int
+    `code`, httpx.HTTPStatusError a `response`. postgrest's APIError only
+    carries PostgREST / SQLSTATE codes, so the Supabase sessions raise
+    HTTPStatusError for 429 and 5xx instead (see clients.py)."""
+    status = getattr(getattr(exc, "response", None), "status_code", None) or getattr(exc, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    if error_status(exc) in OVERLOAD_STATUS_CODES:
+        return True
+    return isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+
+
+class AdaptiveLimiter:
+    """Process-wide cap on in-flight calls to one dependency, adjusted AIMD-style.
+
+    Each healthy completion (fast enough for its call class, recent error
+    rate low) adds 1/limit to the limit, so it grows by about one slot per
+    round of calls. An overload (429/503 or a timeout) halves it, at most
+    once per round: calls that started before the last cut don't cut again.
+    Callers past the limit wait in line until `queue_timeout` and then get
+    QueueTimeout.
+    """
+
+    def __init__(self, name: str, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 queue_timeout: float = 30.0, latency_tolerance: float = 2.0,
+                 max_error_rate: float = 0.1, backoff: float = 0.5):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.backoff = backoff
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self.overloads = 0
+        self.errors = 0
+        self.rejected = 0
+        self._latency = {}
+        self._outcomes = deque(maxlen=100)
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self._take()
+            return True
+
+    def acquire(self, timeout: float = None):
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise QueueTimeout(f"{self.name}: no slot free within the queue deadline")
+                    self._cond.wait(remaining)
+                self._take()
+            finally:
+                self.waiting -= 1
+
+    async def acquire_async(self, timeout: float = None):
+        # The Condition would block the event loop, so async callers poll
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        delay = 0.005
+        with self._cond:
+            self.waiting += 1
+        try:
+            while not self.try_acquire():
+                if time.monotonic() >= deadline:
+                    with self._cond:
+                        self.rejected += 1
+                    raise QueueTimeout(f"{self.name}: no slot free within the queue deadline")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def _take(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self, call: str, started: float, error: BaseException = None):
+        latency = time.monotonic() - started
+        overloaded = error is not None and is_overload_error(error)
+        recorder = self._latency.setdefault(call, LatencyRecorder())
+        with self._cond:
+            self.in_flight -= 1
+            self._outcomes.append(error is not None)
+            if overloaded:
+                self.overloads += 1
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = time.monotonic()
+                    self.decreases += 1
+            elif error is not None:
+                self.errors += 1
+            elif self._healthy(recorder, latency):
+                new_limit = min(self.max_limit, self.limit + 1 / self.limit)
+                if int(new_limit) > int(self.limit):
+                    self.increases += 1
+                self.limit = new_limit
+            self._cond.notify_all()
+        if error is None:
+            recorder.record(latency)
+
+    def abandon(self):
+        # A cancelled call says nothing about the dependency's health
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _healthy(self, recorder: LatencyRecorder, latency: float) -> bool:
+        if sum(self._outcomes) / len(self._outcomes) > self.max_error_rate:
+            return False
+        # Until there is a baseline for this call class, any success counts
+        baseline = recorder.percentile(50) if recorder.count >= 20 else None
+        return baseline is None or latency <= baseline * self.latency_tolerance
+
+    def _finish(self, call: str, started: float, error: BaseException = None):
+        self.release(call, started, error)
+        if error is not None and is_overload_error(error):
+            raise Overloaded(f"{self.name} overloaded: {error}") from error
+
+    @contextlib.contextmanager
+    def slot(self, call: str, timeout: float = None):
+        """Hold a slot for one `call` (a label such as "match" or "profile")."""
+        self.acquire(timeout)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._finish(call, started, e)
+            raise
+        except BaseException:
+            self.abandon()
+            raise
+        self.release(call, started)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, call: str, timeout: float = None):
+        await self.acquire_async(timeout)
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._finish(call, started, e)
+            raise
+        except BaseException:
+            self.abandon()
+            raise
+        self.release(call, started)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "peak_in_flight": self.peak_in_flight,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "overloads": self.overloads,
+                "errors": self.errors,
+                "rejected": self.rejected,
+            }
+        stats["latency"] = {call: recorder.stats() for call, recorder in list(self._latency.items())}
+        return stats
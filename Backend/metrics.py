@@ -0,0 +1,72 @@
+import contextlib
+import threading
+import time
+from collections import deque
+
+
+class LatencyRecorder:
+    """Call count, mean and percentiles over a sliding window of latencies."""
+
+    def __init__(self, window: int = 1024):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total_seconds += seconds
+
+    @contextlib.contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - started)
+
+    def percentile(self, pct: float):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def stats(self) -> dict:
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 2)
+
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total_seconds / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(50)),
+            "p95_ms": ms(self.percentile(95)),
+            "p99_ms": ms(self.percentile(99)),
+        }
+
+
+class StructuredOutputStats:
+    """Outcome counters per structured call: parsed first time, repaired
+    locally, needed a retry, or failed."""
+
+    OUTCOMES = ("ok", "repaired", "retried", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, call: str, outcome: str):
+        with self._lock:
+            counts = self._counts.setdefault(call, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {}
+            for call, counts in self._counts.items():
+                total = sum(counts.values())
+                stats[call] = dict(counts, failure_rate=round(counts["failed"] / total, 4) if total else 0.0)
+            return stats
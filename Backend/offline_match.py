@@ -0,0 +1,220 @@
+import math
+import os
+import re
+import zlib
+
+# Local matching engine: picks skill, project and experience ids with no
+# network calls. Descriptions are not rewritten here; that stays on the LLM path.
+
+NGRAM_SIZE = 3
+HASH_BUCKETS = 1 << 18
+# Cosine similarity a skill needs against some phrase of the job description
+SKILL_MATCH_THRESHOLD = float(os.getenv("OFFLINE_SKILL_THRESHOLD", "0.75"))
+# Minimum score and cap for projects / experiences
+ITEM_MATCH_THRESHOLD = float(os.getenv("OFFLINE_ITEM_THRESHOLD", "0.12"))
+MAX_MATCHED_PROJECTS = int(os.getenv("OFFLINE_MAX_PROJECTS", "3"))
+MAX_MATCHED_EXPERIENCES = int(os.getenv("OFFLINE_MAX_EXPERIENCES", "3"))
+# Score added to a project / experience per matched skill it mentions
+SKILL_MENTION_BONUS = 0.05
+
+# alias -> canonical form, applied to both the profile and the posting
+SKILL_ALIASES = {
+    "js": "javascript",
+    "ecmascript": "javascript",
+    "ts": "typescript",
+    "py": "python",
+    "golang": "go",
+    "reactjs": "react",
+    "react.js": "react",
+    "nodejs": "node.js",
+    "node": "node.js",
+    "vuejs": "vue",
+    "vue.js": "vue",
+    "nextjs": "next.js",
+    "postgres": "postgresql",
+    "psql": "postgresql",
+    "mongo": "mongodb",
+    "k8s": "kubernetes",
+    "aws": "amazon web services",
+    "gcp": "google cloud platform",
+    "azure": "microsoft azure",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "ai": "artificial intelligence",
+    "nlp": "natural language processing",
+    "llm": "large language models",
+    "llms": "large language models",
+    "ci/cd": "continuous integration",
+    "cicd": "continuous integration",
+    "tf": "tensorflow",
+    "sklearn": "scikit-learn",
+    "c sharp": "c#",
+    "cpp": "c++",
+    "rest": "rest api",
+    "restful": "rest api",
+    "ux": "user experience",
+    "ui": "user interface",
+}
+
+_WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#./-]*")
+
+
+def normalize(text: str) -> list:
+    words = [word.rstrip("./-") for word in _WORD_PATTERN.findall((text or "").lower())]
+    normalized = []
+    for word in words:
+        normalized.extend(SKILL_ALIASES.get(word, word).split())
+    return normalized
+
+
+def ngram_counts(word: str) -> dict:
+    counts = {}
+    padded = f" {word} "
+    for i in range(max(1, len(padded) - NGRAM_SIZE + 1)):
+        bucket = zlib.crc32(padded[i:i + NGRAM_SIZE].encode()) % HASH_BUCKETS
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def ngram_vector(words: list) -> dict:
+    """L2-normalized hashed character n-gram counts, as a sparse {bucket: weight} dict."""
+    counts = {}
+    for word in words:
+        for bucket, count in ngram_counts(word).items():
+            counts[bucket] = counts.get(bucket, 0) + count
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {bucket: v / norm for bucket, v in counts.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+def _item_text(item: dict) -> str:
+    return " ".join(str(value) for key, value in item.items() if key != "id" and value)
+
+
+class PhraseIndex:
+    """The 1-3 word phrases of a job description, for fuzzy skill matching.
+
+    A phrase's n-gram counts are the sum of its words' counts, so its dot
+    product with a skill is the sum of its words' dot products. Only the
+    distinct words are hashed, once per job description. By Cauchy-Schwarz a
+    phrase of k words can only reach cosine t if one of its words reaches
+    t / sqrt(k) on its own, so only phrases containing such a word are scored.
+    """
+
+    def __init__(self, job_words: list):
+        self.phrases = set()
+        self._counts = {}
+        self._norms = {}
+        # bucket -> [(word, count)]
+        self._postings = {}
+        # phrase length -> word -> phrases (word tuples) containing it
+        self._containing = {1: {}, 2: {}, 3: {}}
+        for word in set(job_words):
+            counts = self._counts[word] = ngram_counts(word)
+            self._norms[word] = math.sqrt(sum(v * v for v in counts.values()))
+            for bucket, count in counts.items():
+                self._postings.setdefault(bucket, []).append((word, count))
+        for size in (1, 2, 3):
+            containing = self._containing[size]
+            for phrase in {tuple(job_words[i:i + size]) for i in range(len(job_words) - size + 1)}:
+                self.phrases.add(" ".join(phrase))
+                for word in set(phrase):
+                    containing.setdefault(word, []).append(phrase)
+
+    def _phrase_norm(self, phrase: tuple) -> float:
+        counts = {}
+        for word in phrase:
+            for bucket, count in self._counts[word].items():
+                counts[bucket] = counts.get(bucket, 0) + count
+        return math.sqrt(sum(v * v for v in counts.values()))
+
+    def has_match(self, vector: dict, size: int, threshold: float) -> bool:
+        """Whether some phrase of `size` words has cosine >= threshold with `vector`."""
+        # Sums here run in a different order than a direct cosine; don't let
+        # rounding decide a phrase sitting exactly on the threshold
+        threshold -= 1e-9
+        dots = {}
+        for bucket, weight in vector.items():
+            for word, count in self._postings.get(bucket, ()):
+                dots[word] = dots.get(word, 0.0) + weight * count
+        word_threshold = threshold / math.sqrt(size)
+        checked = set()
+        for word, dot in dots.items():
+            if dot < word_threshold * self._norms[word]:
+                continue
+            for phrase in self._containing[size].get(word, ()):
+                if phrase in checked:
+                    continue
+                checked.add(phrase)
+                dot_sum = sum(dots.get(w, 0.0) for w in phrase)
+                # Counts are non-negative, so the words' own norms bound the phrase norm from below
+                if dot_sum < threshold * math.sqrt(sum(self._norms[w] ** 2 for w in phrase)):
+                    continue
+                if dot_sum >= threshold * self._phrase_norm(phrase):
+                    return True
+        return False
+
+
+def match_skills(skills: list, job_words: list) -> list:
+    index = PhraseIndex(job_words)
+
+    matched = []
+    for skill in skills:
+        skill_words = normalize(skill.get("name"))
+        if not skill_words:
+            continue
+        if " ".join(skill_words) in index.phrases:
+            matched.append(skill["id"])
+            continue
+        # Fuzzy match against job phrases of the same length (typos, plurals)
+        if index.has_match(ngram_vector(skill_words), min(len(skill_words), 3), SKILL_MATCH_THRESHOLD):
+            matched.append(skill["id"])
+    return matched
+
+
+def rank_items(items: list, job_vector: dict, matched_skill_names: list, threshold: float, limit: int) -> list:
+    scored = []
+    for item in items:
+        text_words = normalize(_item_text(item))
+        text = " ".join(text_words)
+        score = cosine(ngram_vector(text_words), job_vector)
+        score += SKILL_MENTION_BONUS * sum(1 for name in matched_skill_names if f" {name} " in f" {text} ")
+        if score >= threshold:
+            scored.append((score, item["id"]))
+    scored.sort(key=lambda pair: -pair[0])
+    return [item_id for _, item_id in scored[:limit]]
+
+
+def offline_match(profile: dict, job_description: str) -> dict:
+    """Pick matching ids locally. Returns the same keys as the Gemini match response."""
+    job_words = normalize(job_description)
+    job_vector = ngram_vector(job_words)
+
+    matched_skill_ids = match_skills(profile.get("skills") or [], job_words)
+    matched_ids = set(matched_skill_ids)
+    matched_skill_names = [
+        " ".join(normalize(skill.get("name")))
+        for skill in profile.get("skills") or []
+        if skill["id"] in matched_ids
+    ]
+
+    return {
+        "job_title": None,
+        "job_company": None,
+        "job_raw_description": job_description,
+        "matched_skill_ids": matched_skill_ids,
+        "matched_project_ids": rank_items(
+            profile.get("projects") or [], job_vector, matched_skill_names,
+            ITEM_MATCH_THRESHOLD, MAX_MATCHED_PROJECTS,
+        ),
+        "matched_experience_ids": rank_items(
+            profile.get("experiences") or [], job_vector, matched_skill_names,
+            ITEM_MATCH_THRESHOLD, MAX_MATCHED_EXPERIENCES,
+        ),
+        "improved_descriptions": {},
+    }
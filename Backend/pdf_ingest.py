@@ -0,0 +1,94 @@
+import atexit
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Documents with at least this many pages are split across the process pool
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "12"))
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked from a multithreaded web process, like the resume job workers
+            _pool = ProcessPoolExecutor(max_workers=PDF_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def spool_upload(stream, max_memory_bytes: int):
+    """Copy an upload stream into a spooled buffer, hashing it on the way.
+
+    The buffer stays in memory up to `max_memory_bytes` and only rolls over
+    to an anonymous temp file above that; closing it (or leaving its `with`
+    block) removes everything. Returns `(spool, sha256 hexdigest)` with the
+    spool rewound to the start.
+    """
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    try:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            spool.write(chunk)
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    return spool, digest.hexdigest()
+
+
+def _extract_pages(reader, start: int, stop: int) -> list:
+    results = []
+    for page in reader.pages[start:stop]:
+        started = time.perf_counter()
+        text = page.extract_text() or ""
+        results.append((text, time.perf_counter() - started))
+    return results
+
+
+# Runs in a pool worker: PdfReader objects can't be pickled, so each worker
+# re-opens the document from its bytes and extracts its own page range.
+def _extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> list:
+    from PyPDF2 import PdfReader
+    return _extract_pages(PdfReader(io.BytesIO(pdf_bytes)), start, stop)
+
+
+def extract_pdf_text(source, page_timings: list = None, parallel: bool = True) -> str:
+    """Extract the text of every page, in page order.
+
+    Long documents (PDF_PARALLEL_MIN_PAGES and up) are split into contiguous
+    page ranges parsed in parallel by a bounded process pool, unless
+    `parallel` is False (e.g. when the caller already runs in a pool). If
+    `page_timings` is given, the seconds spent on each page are appended to it.
+    """
+    from PyPDF2 import PdfReader  # imported on first use to keep startup light
+    reader = PdfReader(source)
+    page_count = len(reader.pages)
+
+    if not parallel or page_count < PDF_PARALLEL_MIN_PAGES or PDF_POOL_WORKERS < 2:
+        results = _extract_pages(reader, 0, page_count)
+    else:
+        source.seek(0)
+        pdf_bytes = source.read()
+        chunk_size = -(-page_count // PDF_POOL_WORKERS)
+        pool = _get_pool()
+        futures = [
+            pool.submit(_extract_page_range, pdf_bytes, start, min(start + chunk_size, page_count))
+            for start in range(0, page_count, chunk_size)
+        ]
+        results = [page for future in futures for page in future.result()]
+
+    if page_timings is not None:
+        page_timings.extend(seconds for _, seconds in results)
+    return "".join(text for text, _ in results)
@@ -0,0 +1,75 @@
+import math
+import os
+import re
+from collections import Counter
+
+# Items per category passed to the match prompt; 0 keeps every item
+PREFILTER_TOP_K = {
+    "skills": int(os.getenv("PREFILTER_TOP_K_SKILLS", "25")),
+    "projects": int(os.getenv("PREFILTER_TOP_K_PROJECTS", "8")),
+    "experiences": int(os.getenv("PREFILTER_TOP_K_EXPERIENCES", "8")),
+}
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps tokens like c++, c#, node.js and ci/cd together
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#./-]*")
+
+
+def tokenize(text: str) -> list:
+    return [token.rstrip("./-") for token in _TOKEN_PATTERN.findall(text.lower())]
+
+
+def item_text(item: dict) -> str:
+    return " ".join(str(value) for key, value in item.items() if key != "id" and value)
+
+
+def bm25_scores(query: str, documents: list) -> list:
+    """BM25 score of each document against the query terms.
+
+    IDF is computed over `documents` with the always-positive
+    ln(1 + (N - df + 0.5) / (df + 0.5)) form, so even a term that appears in
+    every item still counts.
+    """
+    query_terms = set(tokenize(query))
+    doc_terms = [Counter(tokenize(doc)) for doc in documents]
+    if not doc_terms:
+        return []
+    doc_count = len(doc_terms)
+    avg_len = sum(sum(terms.values()) for terms in doc_terms) / doc_count or 1.0
+    doc_freq = Counter(term for terms in doc_terms for term in terms if term in query_terms)
+    idf = {
+        term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        for term, df in doc_freq.items()
+    }
+
+    scores = []
+    for terms in doc_terms:
+        length = sum(terms.values())
+        score = 0.0
+        for term, weight in idf.items():
+            tf = terms.get(term, 0)
+            if tf:
+                score += weight * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+def top_k_items(items: list, job_description: str, k: int) -> list:
+    """The k items most relevant to the job description, in their original order."""
+    if not k or len(items) <= k:
+        return list(items)
+    scores = bm25_scores(job_description, [item_text(item) for item in items])
+    ranked = sorted(range(len(items)), key=lambda i: -scores[i])
+    keep = set(ranked[:k])
+    return [item for i, item in enumerate(items) if i in keep]
+
+
+def prefilter_profile(profile: dict, job_description: str, top_k: dict = None) -> dict:
+    """Copy of the profile with each matchable category cut down to its top-K items."""
+    top_k = PREFILTER_TOP_K if top_k is None else top_k
+    filtered = dict(profile)
+    for category, k in top_k.items():
+        filtered[category] = top_k_items(profile.get(category) or [], job_description, k)
+    return filtered
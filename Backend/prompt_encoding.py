@@ -0,0 +1,103 @@
+import json
+import re
+import threading
+
+# How profile items are embedded in the match prompt:
+#   "json"    - pretty-printed JSON (indent=2), the original format
+#   "compact" - minified JSON
+#   "table"   - one header line of column names, then one `|`-separated line
+#               per item; ids stay in the first column for the model to echo
+PROMPT_ENCODINGS = ("json", "compact", "table")
+
+TABLE_FORMAT_NOTE = (
+    "Each section below is a table: the first line names the columns and every "
+    "following line is one item, with fields separated by |. "
+    "Return ids exactly as they appear in the id column.\n"
+)
+
+_TOKEN_PATTERN = re.compile(r"\n[ \t]*|[ \t]{2,}|[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+
+def _table_cell(value) -> str:
+    if value is None:
+        return ""
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("|", "\\|").replace("\r", "").replace("\n", "\\n")
+
+
+def encode_items(items: list, encoding: str = "json") -> str:
+    if encoding == "compact":
+        return json.dumps(items, separators=(",", ":"), ensure_ascii=False)
+    if encoding == "table":
+        if not items:
+            return "(none)"
+        columns = list(items[0].keys())
+        if "id" in columns:
+            columns.remove("id")
+            columns.insert(0, "id")
+        lines = ["|".join(columns)]
+        lines.extend("|".join(_table_cell(item.get(col)) for col in columns) for item in items)
+        return "\n".join(lines)
+    return json.dumps(items, indent=2)
+
+
+def format_note(encoding: str) -> str:
+    return TABLE_FORMAT_NOTE if encoding == "table" else ""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough, offline token count for comparing prompt encodings.
+
+    Words count as one token per 4 letters (rounded up), digit runs per 3
+    digits, and each punctuation mark or indentation run as its own token,
+    which tracks SentencePiece-style tokenizers closely enough for relative
+    comparisons between encodings.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece[0].isalpha():
+            tokens += -(-len(piece) // 4)
+        elif piece[0].isdigit():
+            tokens += -(-len(piece) // 3)
+        else:
+            tokens += 1
+    return tokens
+
+
+class TokenAccounting:
+    """Per-encoding prompt counts with estimated and model-reported token totals."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def _entry(self, encoding: str) -> dict:
+        return self._totals.setdefault(
+            encoding, {"prompts": 0, "chars": 0, "estimated_tokens": 0, "reported_prompts": 0, "reported_tokens": 0}
+        )
+
+    def record_prompt(self, encoding: str, prompt: str) -> int:
+        estimated = estimate_tokens(prompt)
+        with self._lock:
+            entry = self._entry(encoding)
+            entry["prompts"] += 1
+            entry["chars"] += len(prompt)
+            entry["estimated_tokens"] += estimated
+        return estimated
+
+    def record_reported(self, encoding: str, prompt_tokens: int):
+        with self._lock:
+            entry = self._entry(encoding)
+            entry["reported_prompts"] += 1
+            entry["reported_tokens"] += prompt_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {}
+            for encoding, entry in self._totals.items():
+                stats[encoding] = dict(entry)
+                if entry["prompts"]:
+                    stats[encoding]["avg_estimated_tokens"] = round(entry["estimated_tokens"] / entry["prompts"], 1)
+                if entry["reported_prompts"]:
+                    stats[encoding]["avg_reported_tokens"] = round(entry["reported_tokens"] / entry["reported_prompts"], 1)
+            return stats
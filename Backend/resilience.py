@@ -0,0 +1,284 @@
+import asyncio
+import concurrent.futures
+import os
+import random
+import threading
+import time
+
+from breakers import CircuitOpen
+from limiter import Overloaded, QueueTimeout, error_status, is_overload_error
+from metrics import LatencyRecorder
+
+# Transport-level failures worth another attempt, by class name so httpx and
+# requests don't have to be imported here
+TRANSIENT_ERROR_NAMES = {
+    "ConnectError", "ReadError", "WriteError", "RemoteProtocolError", "ProxyError",
+    "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "ConnectionError", "ChunkedEncodingError", "ServerError",
+}
+# Failures that mean the request never reached the server, so even a
+# non-idempotent call can be sent again
+CONNECT_ERROR_NAMES = {"ConnectError", "ConnectTimeout", "PoolTimeout"}
+
+# Threads that run sync attempts with a timeout or a hedge. An attempt that
+# times out keeps its thread until the underlying client gives up.
+RESILIENCE_POOL_SIZE = int(os.getenv("RESILIENCE_POOL_SIZE", "128"))
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> concurrent.futures.ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ThreadPoolExecutor(max_workers=RESILIENCE_POOL_SIZE, thread_name_prefix="resilience")
+        return _pool
+
+
+class AttemptTimeout(TimeoutError):
+    pass
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    if isinstance(exc, (QueueTimeout, CircuitOpen)):
+        # The caller already waited out its queue deadline, or the dependency is known to be down
+        return False
+    if isinstance(exc, Overloaded) or is_overload_error(exc) or isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    status = error_status(exc)
+    if status is not None and status >= 500:
+        return True
+    return type(exc).__name__ in TRANSIENT_ERROR_NAMES
+
+
+def is_connect_error(exc: BaseException) -> bool:
+    return isinstance(exc, ConnectionRefusedError) or type(exc).__name__ in CONNECT_ERROR_NAMES
+
+
+def is_outage_error(exc: BaseException) -> bool:
+    """Transient errors that say the dependency is unhealthy, for circuit
+    breakers. A 429 means "slow down", which the limiter handles."""
+    if isinstance(exc, Overloaded) and not isinstance(exc, (QueueTimeout, CircuitOpen)):
+        exc = exc.__cause__ or exc
+    return is_transient_error(exc) and error_status(exc) != 429
+
+
+class CallPolicy:
+    """Retries, per-attempt timeout and optional hedging for one class of
+    outbound call (idempotent reads, upserts, LLM generations).
+
+    Failed attempts for which `retry_if` holds (transient errors by default)
+    are retried up to `attempts` times in total, sleeping a random 0..min(max_backoff, backoff * 2**n) seconds
+    between them (full jitter). With `hedge_percentile` set, an attempt
+    still running after that percentile of recent latencies gets a second,
+    identical request and whichever finishes first wins. Only use hedging
+    for calls that are safe to run twice. With a `breaker`, attempts fail
+    fast with CircuitOpen while it is open. With a `limiter`, calls made
+    with `slot=<label>` hold a limiter slot for each attempt; an attempt
+    that times out gives its slot back as an overload, even though its
+    thread may still be waiting on the transport. Attempts still queued for
+    a pool thread when the call gives up are cancelled.
+    """
+
+    def __init__(self, name: str, attempts: int = 3, backoff: float = 0.1, max_backoff: float = 2.0,
+                 timeout: float = None, hedge_percentile: float = None, hedge_min_samples: int = 50,
+                 breaker=None, limiter=None, retry_if=is_transient_error):
+        self.name = name
+        self.retry_if = retry_if
+        self.limiter = limiter
+        # Checked before every attempt; a hedged pair counts as one call
+        self.breaker = breaker
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout or None
+        self.hedge_percentile = hedge_percentile or None
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyRecorder()
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ("calls", "attempts", "retries", "timeouts", "hedges", "hedge_wins", "failures"), 0
+        )
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, **defaults) -> "CallPolicy":
+        """<PREFIX>_ATTEMPTS, <PREFIX>_TIMEOUT_SECONDS and <PREFIX>_HEDGE_PERCENTILE
+        override the defaults; 0 turns the timeout or hedging off."""
+        for key, env, cast in (("attempts", "ATTEMPTS", int),
+                               ("timeout", "TIMEOUT_SECONDS", float),
+                               ("hedge_percentile", "HEDGE_PERCENTILE", float)):
+            value = os.getenv(f"{prefix}_{env}")
+            if value is not None:
+                defaults[key] = cast(value)
+        return cls(name, **defaults)
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counts[key] += n
+
+    def hedge_delay(self):
+        if not self.hedge_percentile or self.latency.count < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _sleep_for(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+    def call(self, fn, *args, hedge: bool = True, slot: str = None, **kwargs):
+        self._count("calls")
+        for attempt in range(self.attempts):
+            started = time.perf_counter()
+            if self.breaker:
+                self.breaker.before_call()
+            try:
+                result = self._limited_attempt(fn, args, kwargs, hedge, slot)
+            except QueueTimeout:
+                self._queue_timeout()
+                raise
+            except Exception as e:
+                if self.breaker:
+                    self.breaker.after_call(e)
+                if not self.retry_if(e) or attempt == self.attempts - 1:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                print(f"{self.name}: attempt {attempt + 1} failed ({type(e).__name__}: {e}), retrying")
+                time.sleep(self._sleep_for(attempt))
+                continue
+            if self.breaker:
+                self.breaker.after_call()
+            self.latency.record(time.perf_counter() - started)
+            return result
+
+    def _queue_timeout(self):
+        # Never reached the dependency: no verdict for the breaker, and no retry
+        if self.breaker:
+            self.breaker.cancel_call()
+        self._count("failures")
+
+    def _limited_attempt(self, fn, args, kwargs, hedge: bool, slot: str):
+        if self.limiter is None or slot is None:
+            return self._attempt(fn, args, kwargs, hedge)
+        with self.limiter.slot(slot):
+            return self._attempt(fn, args, kwargs, hedge)
+
+    def _attempt(self, fn, args, kwargs, hedge: bool):
+        hedge_delay = self.hedge_delay() if hedge else None
+        if self.timeout is None and hedge_delay is None:
+            self._count("attempts")
+            return fn(*args, **kwargs)
+
+        pool = _get_pool()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self._count("attempts")
+        futures = [pool.submit(fn, *args, **kwargs)]
+        if hedge_delay is not None:
+            done, _ = concurrent.futures.wait(futures, timeout=min(hedge_delay, self.timeout or hedge_delay))
+            if not done:
+                self._count("hedges")
+                self._count("attempts")
+                futures.append(pool.submit(fn, *args, **kwargs))
+
+        pending = list(futures)
+        error = None
+        try:
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, not_done = concurrent.futures.wait(pending, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED)
+                if not done:
+                    self._count("timeouts")
+                    raise AttemptTimeout(f"{self.name}: no response within {self.timeout}s")
+                for future in done:
+                    if future.exception() is None:
+                        if future is not futures[0]:
+                            self._count("hedge_wins")
+                        return future.result()
+                    error = future.exception()
+                pending = list(not_done)
+            raise error
+        finally:
+            # Running threads can't be stopped, but queued attempts can
+            for future in futures:
+                future.cancel()
+
+    async def call_async(self, fn, *args, hedge: bool = True, slot: str = None, **kwargs):
+        """Same as `call`, for a coroutine function."""
+        self._count("calls")
+        for attempt in range(self.attempts):
+            started = time.perf_counter()
+            if self.breaker:
+                self.breaker.before_call()
+            try:
+                result = await self._limited_attempt_async(fn, args, kwargs, hedge, slot)
+            except QueueTimeout:
+                self._queue_timeout()
+                raise
+            except asyncio.CancelledError:
+                if self.breaker:
+                    self.breaker.cancel_call()
+                raise
+            except Exception as e:
+                if self.breaker:
+                    self.breaker.after_call(e)
+                if not self.retry_if(e) or attempt == self.attempts - 1:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                print(f"{self.name}: attempt {attempt + 1} failed ({type(e).__name__}: {e}), retrying")
+                await asyncio.sleep(self._sleep_for(attempt))
+                continue
+            if self.breaker:
+                self.breaker.after_call()
+            self.latency.record(time.perf_counter() - started)
+            return result
+
+    async def _limited_attempt_async(self, fn, args, kwargs, hedge: bool, slot: str):
+        if self.limiter is None or slot is None:
+            return await self._attempt_async(fn, args, kwargs, hedge)
+        async with self.limiter.slot_async(slot):
+            return await self._attempt_async(fn, args, kwargs, hedge)
+
+    async def _attempt_async(self, fn, args, kwargs, hedge: bool):
+        hedge_delay = self.hedge_delay() if hedge else None
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self._count("attempts")
+        tasks = [asyncio.ensure_future(fn(*args, **kwargs))]
+        try:
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=min(hedge_delay, self.timeout or hedge_delay))
+                if not done:
+                    self._count("hedges")
+                    self._count("attempts")
+                    tasks.append(asyncio.ensure_future(fn(*args, **kwargs)))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._count("timeouts")
+                    raise AttemptTimeout(f"{self.name}: no response within {self.timeout}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Unlike threads, losing or timed-out coroutines can be cancelled
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counts)
+        stats.update(
+            attempts_allowed=self.attempts,
+            timeout_seconds=self.timeout,
+            hedge_percentile=self.hedge_percentile,
+            hedge_delay_ms=None if self.hedge_delay() is None else round(self.hedge_delay() * 1000, 2),
+            latency=self.latency.stats(),
+        )
+        return stats
@@ -0,0 +1,260 @@
+import atexit
+import contextlib
+import json
+import multiprocessing
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resume_jobs (
+    id TEXT PRIMARY KEY,
+    clerk_user_id TEXT NOT NULL,
+    file_digest TEXT,
+    pdf BLOB,
+    status TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS resume_jobs_status ON resume_jobs (status, created_at);
+"""
+
+# Workers are spawned, not forked. The web process is multithreaded, and a
+# forked child inherits its executors, locks and the async runtime's loop as
+# they were at fork time, with none of the threads that drive them.
+_mp = multiprocessing.get_context("spawn")
+
+
+class ResumeJobQueue:
+    """Durable resume-processing queue stored in a local SQLite file.
+
+    Jobs move queued -> running -> done | failed. The PDF bytes are kept in
+    the row until the job finishes, so queued work survives a restart. A
+    claimed job is leased for `lease_seconds` and its worker keeps renewing
+    the lease while it runs; a `running` job whose lease ran out (its worker
+    died) can be claimed again.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 60.0):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        # The database file and schema are created on first use, not at import
+        self._ready = False
+
+    @contextlib.contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(resume_jobs)")}
+                if "lease_expires_at" not in columns:
+                    # Queue files created before leases existed
+                    try:
+                        conn.execute("ALTER TABLE resume_jobs ADD COLUMN lease_expires_at REAL")
+                    except sqlite3.OperationalError as e:
+                        if "duplicate column" not in str(e):
+                            raise
+                self._ready = True
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, clerk_user_id: str, pdf_bytes: bytes, file_digest: str = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO resume_jobs (id, clerk_user_id, file_digest, pdf, status, progress, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, clerk_user_id, file_digest, pdf_bytes, now, now),
+            )
+        return job_id
+
+    def claim(self):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, clerk_user_id, file_digest, pdf, status FROM resume_jobs"
+                " WHERE status = 'queued' OR (status = 'running' AND lease_expires_at < ?)"
+                " ORDER BY created_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE resume_jobs SET status = 'running', progress = 'starting', updated_at = ?,"
+                    " lease_expires_at = ? WHERE id = ?",
+                    (now, now + self.lease_seconds, row["id"]),
+                )
+            conn.execute("COMMIT")
+        if row is None:
+            return None
+        if row["status"] == "running":
+            print("Reclaiming resume job with an expired lease:", row["id"])
+        return dict(row)
+
+    def renew_lease(self, job_id: str):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE resume_jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id),
+            )
+
+    def set_progress(self, job_id: str, progress: str):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE resume_jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                (progress, time.time(), job_id),
+            )
+
+    def complete(self, job_id: str, result: dict):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE resume_jobs SET status = 'done', progress = 'done', result = ?, pdf = NULL, updated_at = ?,"
+                " lease_expires_at = NULL WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE resume_jobs SET status = 'failed', error = ?, pdf = NULL, updated_at = ?,"
+                " lease_expires_at = NULL WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str):
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT id, clerk_user_id, status, progress, result, error, created_at, updated_at"
+                " FROM resume_jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self) -> dict:
+        with self._connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM resume_jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+def _renew_lease(queue: ResumeJobQueue, job_id: str, done: threading.Event):
+    while not done.wait(queue.lease_seconds / 3):
+        queue.renew_lease(job_id)
+
+
+def _worker_main(db_path: str, poll_interval: float, lease_seconds: float):
+    # The parent asks for shutdown with SIGTERM, which lets the current job
+    # finish; Ctrl-C is ignored so a job isn't torn down half-saved. (No
+    # shared multiprocessing.Event: a worker killed inside wait() would leave
+    # its lock held and hang everyone else.)
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from app import process_resume, remember_upload
+
+    queue = ResumeJobQueue(db_path, lease_seconds=lease_seconds)
+    while not stopping:
+        job = queue.claim()
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        job_id = job["id"]
+        done = threading.Event()
+        threading.Thread(target=_renew_lease, args=(queue, job_id, done), daemon=True).start()
+        try:
+            result = process_resume(
+                job["pdf"],
+                job["clerk_user_id"],
+                progress=lambda stage: queue.set_progress(job_id, stage),
+            )
+            # A later upload of the same PDF can then skip the pipeline, as with sync uploads
+            remember_upload(job["clerk_user_id"], job["file_digest"], result)
+            queue.complete(job_id, result)
+        except Exception as e:
+            print("Resume job failed:", job_id, e)
+            queue.fail(job_id, str(e))
+        finally:
+            done.set()
+
+
+class ResumeJobWorkers:
+    """A pool of background processes draining a ResumeJobQueue.
+
+    One process should own the pool: serve.py starts it in its master and
+    `detach()`es it in the web workers it forks. Dead workers are replaced
+    on the next `ensure_started()`.
+    """
+
+    def __init__(self, db_path: str, num_workers: int = 2, poll_interval: float = 0.5, drain_timeout: float = 120.0,
+                 lease_seconds: float = 60.0):
+        self.db_path = db_path
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.lease_seconds = lease_seconds
+        self.detached = False
+        self.restarts = 0
+        self._processes = []
+        self._atexit_registered = False
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        with self._lock:
+            if self.detached:
+                return
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+            alive = [process for process in self._processes if process.is_alive()]
+            if self._processes and len(alive) < len(self._processes):
+                print(f"Restarting {len(self._processes) - len(alive)} resume job worker(s)")
+                self.restarts += len(self._processes) - len(alive)
+            while len(alive) < self.num_workers:
+                process = _mp.Process(
+                    target=_worker_main,
+                    args=(self.db_path, self.poll_interval, self.lease_seconds),
+                )
+                process.start()
+                alive.append(process)
+            self._processes = alive
+
+    def detach(self):
+        # In a process forked from the owner: the workers are the owner's to
+        # run and stop, this process only enqueues
+        with self._lock:
+            self.detached = True
+            self._processes = []
+
+    def shutdown(self):
+        # Let each worker finish its current job, then stop picking up new ones
+        with self._lock:
+            if not self._processes:
+                return
+            for process in self._processes:
+                process.terminate()
+            deadline = time.monotonic() + self.drain_timeout
+            for process in self._processes:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+            self._processes = []
+
+    def alive(self):
+        # None when another process (the serve.py master) owns the workers
+        if self.detached:
+            return None
+        return sum(1 for process in self._processes if process.is_alive())
@@ -0,0 +1,126 @@
+import re
+from typing import List, Optional
+
+from pydantic import BaseModel, ValidationError
+
+# Response models passed to Gemini's JSON-schema response mode and used to
+# validate its output in a single parse.
+
+
+class WorkExperience(BaseModel):
+    position: Optional[str] = None
+    company: Optional[str] = None
+    duration: Optional[str] = None
+    description: Optional[str] = None
+
+
+class Education(BaseModel):
+    degree: Optional[str] = None
+    institution: Optional[str] = None
+    year: Optional[str] = None
+
+
+class Project(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    link: Optional[str] = None
+
+
+class ExtractedProfile(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    skills: List[str] = []
+    work_experience: List[WorkExperience] = []
+    education: List[Education] = []
+    projects: List[Project] = []
+    links: List[str] = []
+
+
+class ImprovedDescription(BaseModel):
+    id: str
+    description: str
+
+
+class MatchResult(BaseModel):
+    # Gemini's schema mode has no free-form maps, so improved descriptions
+    # arrive as a list and are turned back into {id: description} afterwards.
+    matched_skill_ids: List[int] = []
+    matched_project_ids: List[int] = []
+    matched_experience_ids: List[int] = []
+    improved_descriptions: List[ImprovedDescription] = []
+    job_title: Optional[str] = None
+    job_company: Optional[str] = None
+    job_raw_description: Optional[str] = None
+
+    def to_response(self) -> dict:
+        response = self.model_dump(exclude={"improved_descriptions"})
+        response["improved_descriptions"] = improved_description_map(self.model_dump()["improved_descriptions"])
+        return response
+
+
+def improved_description_map(value) -> dict:
+    """{id: description} from either the dict or the list-of-objects form."""
+    if isinstance(value, dict):
+        return value
+    return {
+        str(entry.get("id")): entry.get("description")
+        for entry in value or []
+        if isinstance(entry, dict)
+    }
+
+
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+
+
+def repair_json(text: str) -> str:
+    """Cheap local fixes for near-miss JSON: code fences, text around the
+    object, trailing commas, and brackets or strings left open by a
+    truncated response."""
+    text = _FENCE.sub("", text or "")
+    start = text.find("{")
+    if start == -1:
+        return text
+    text = _TRAILING_COMMA.sub(r"\1", text[start:])
+
+    closers = []
+    in_string = escape = False
+    end = len(text)
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]" and closers:
+            closers.pop()
+            if not closers:
+                end = i + 1
+                break
+    if not closers:
+        return text[:end]
+    repaired = text + ('"' if in_string else "")
+    repaired = _TRAILING_COMMA.sub(r"\1", repaired.rstrip().rstrip(",") + "".join(reversed(closers)))
+    return repaired
+
+
+def parse_model_output(text: str, model):
+    """Validate `text` against `model`, trying `repair_json` once on failure.
+
+    Returns `(instance, repaired)`; raises ValidationError if neither the raw
+    nor the repaired text validates.
+    """
+    try:
+        return model.model_validate_json(text), False
+    except ValidationError:
+        repaired = repair_json(text)
+        if repaired == text:
+            raise
+    return model.model_validate_json(repaired), True
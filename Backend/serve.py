@@ -0,0 +1,235 @@
+"""Production launcher for the Flask app, replacing `python app.py`.
+
+Usage:
+    python serve.py                                   # one worker per core on 127.0.0.1:5000
+    python serve.py --host 0.0.0.0 --workers 4 --threads 16
+
+The master imports app.py once, warms what is safe to share across fork
+(imported modules, the Clerk JWKS keys), binds the listening socket and then
+forks --workers processes that all accept on it. Each worker builds its own
+Gemini and Supabase clients before accepting, serves requests from a pool of
+--threads threads and exits after --max-requests requests (plus up to
+--max-requests-jitter, so workers don't all recycle at once); the master
+starts a replacement. The master also runs the resume job workers behind
+/upload?async=1 (RESUME_JOB_WORKERS of them), restarting any that die. SIGTERM
+or Ctrl+C stops accepting, lets in-flight requests finish for up to
+--graceful-timeout seconds, then kills what is left and drains the job workers.
+
+Platforms without os.fork (Windows) run a single worker in-process.
+"""
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection: an idle keep-alive client can't hold a
+    # pool thread, and --max-requests counts requests.
+    protocol_version = "HTTP/1.0"
+
+
+class QuietRequestHandler(RequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server handing each connection to a fixed thread pool.
+
+    The accept loop blocks while all threads are busy, leaving new
+    connections in the shared backlog for other workers to pick up.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads: int, max_requests: int = 0, fd=None, handler=RequestHandler):
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self.slots = threading.BoundedSemaphore(threads)
+        self.max_requests = max_requests
+        self.handled = 0
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.handled += 1
+        self.pool.submit(self._process, request, client_address)
+        if self.max_requests and self.handled >= self.max_requests:
+            self.stop()
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def stop(self):
+        # shutdown() waits for serve_forever to return, so it can't run on the accept thread
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def drain(self):
+        self.pool.shutdown(wait=True)
+
+
+def warm_master(app_module):
+    # Plain data is safe to inherit. HTTP clients hold sockets, so the
+    # registry (keyed by pid) builds them again in each worker.
+    if not app_module.jwks_cache.refresh(force=True):
+        print("serve: JWKS warm-up failed, workers will fetch keys on first request")
+
+
+def warm_worker(app_module):
+    app_module.registry.gemini()
+    app_module.registry.supabase()
+
+
+def run_worker(app_module, args, fd=None) -> int:
+    warm_worker(app_module)
+    max_requests = args.max_requests + random.randint(0, args.max_requests_jitter) if args.max_requests else 0
+    server = PooledWSGIServer(
+        args.host, args.port, app_module.app,
+        threads=args.threads,
+        max_requests=max_requests,
+        fd=fd,
+        handler=QuietRequestHandler if args.no_access_log else RequestHandler,
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+    print(f"serve: worker {os.getpid()} ready ({args.threads} threads, max_requests={max_requests or 'unlimited'})")
+    server.serve_forever()
+    server.drain()
+    print(f"serve: worker {os.getpid()} exiting after {server.handled} requests")
+    return 0
+
+
+class Master:
+    def __init__(self, app_module, args):
+        self.app_module = app_module
+        self.args = args
+        self.pid = os.getpid()
+        self.workers = {}
+        self.running = True
+        self.socket = None
+
+    def bind(self):
+        family = socket.AF_INET6 if ":" in self.args.host else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.args.host, self.args.port))
+        self.socket.listen(self.args.backlog)
+        self.socket.set_inheritable(True)
+
+    def spawn_worker(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.monotonic()
+            return
+        # Child: the master's signal handling doesn't apply here. Ctrl+C
+        # reaches the whole process group, so leave draining to the master's SIGTERM.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # The master owns the resume job workers; this process only enqueues
+        self.app_module.resume_job_workers.detach()
+        try:
+            code = run_worker(self.app_module, self.args, fd=self.socket.fileno())
+        except Exception as e:
+            print(f"serve: worker {os.getpid()} failed:", e)
+            code = 1
+        # Normal interpreter exit, so atexit handlers (the PDF pool) run
+        sys.exit(code)
+
+    def reap_workers(self):
+        # Only our own pids: waitpid(-1) would also reap the resume job
+        # workers, which multiprocessing waits on itself
+        for pid in list(self.workers):
+            try:
+                reaped, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.pop(pid, None)
+                continue
+            if not reaped:
+                continue
+            started = self.workers.pop(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if code and self.running:
+                print(f"serve: worker {pid} exited with {code}")
+                # Don't spin if workers die right after boot
+                if time.monotonic() - started < 1:
+                    time.sleep(1)
+
+    def handle_stop(self, signum, frame):
+        self.running = False
+
+    def run(self):
+        self.bind()
+        warm_master(self.app_module)
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        print(f"serve: master {self.pid} listening on {self.args.host}:{self.args.port}, "
+              f"{self.args.workers} workers x {self.args.threads} threads")
+        try:
+            while self.running:
+                self.reap_workers()
+                while self.running and len(self.workers) < self.args.workers:
+                    self.spawn_worker()
+                # Starts the job workers on the first pass, then replaces dead ones
+                self.app_module.resume_job_workers.ensure_started()
+                time.sleep(0.2)
+        finally:
+            if os.getpid() == self.pid:
+                self.stop()
+
+    def stop(self):
+        print(f"serve: stopping {len(self.workers)} workers")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.args.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap_workers()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            print(f"serve: worker {pid} did not stop within {self.args.graceful_timeout}s, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.socket.close()
+        self.app_module.resume_job_workers.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Flask app with preforked worker processes.")
+    parser.add_argument("--host", default=os.getenv("SERVE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVE_PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("SERVE_THREADS", "8")), help="request threads per worker")
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("SERVE_MAX_REQUESTS", "1000")), help="recycle a worker after this many requests (0: never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(os.getenv("SERVE_MAX_REQUESTS_JITTER", "100")))
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30")))
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("SERVE_BACKLOG", "1024")))
+    parser.add_argument("--no-access-log", action="store_true", help="skip per-request log lines (benchmarking)")
+    args = parser.parse_args()
+
+    import app as app_module
+
+    if not hasattr(os, "fork"):
+        print("serve: os.fork is unavailable, running a single worker")
+        warm_master(app_module)
+        sys.exit(run_worker(app_module, args))
+    Master(app_module, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Report what importing app.py and building the Flask app cost.
+
+Usage:
+    python startup_profile.py                          # import + create_app()
+    python startup_profile.py --top 20                 # more packages in the breakdown
+    python startup_profile.py --warm                   # also build the Gemini / Supabase clients
+    python startup_profile.py --budget-ms 300 --budget-mb 90
+
+Each run measures a fresh interpreter started with `-X importtime`: wall
+time for `import app` and `create_app()`, peak RSS, import time per
+top-level package, and which heavy libraries got loaded. With a budget
+set, the exit status is 1 when startup goes over it, so the check can run
+in CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Libraries that should only load on first use, not when app.py is imported
+DEFERRED_MODULES = ("google.genai", "supabase", "postgrest", "PyPDF2", "jwt", "cryptography", "requests", "httpx", "pydantic")
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+if {warm!r}:
+    app.registry.gemini()
+    app.registry.supabase()
+warmed = time.perf_counter()
+try:
+    import resource
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+except ImportError:
+    peak_rss_mb = None
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "warm_ms": (warmed - created) * 1000,
+    "peak_rss_mb": peak_rss_mb,
+    "loaded": [name for name in {deferred!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Self time per top-level package, in ms, from `-X importtime` output."""
+    per_package = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        package = name.strip().split(".")[0]
+        per_package[package] = per_package.get(package, 0.0) + int(self_us) / 1000
+    return per_package
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app.py cold start.")
+    parser.add_argument("--top", type=int, default=12, help="packages to list")
+    parser.add_argument("--warm", action="store_true", help="also build the outbound clients")
+    parser.add_argument("--budget-ms", type=float, help="max import + create_app time")
+    parser.add_argument("--budget-mb", type=float, help="max peak RSS")
+    args = parser.parse_args()
+
+    code = CHILD.format(warm=args.warm, deferred=DEFERRED_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        sys.stderr.write("\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:")))
+        sys.exit(proc.returncode)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    per_package = parse_importtime(proc.stderr)
+
+    startup_ms = result["import_ms"] + result["create_app_ms"]
+    print(f"import app:    {result['import_ms']:8.1f} ms")
+    print(f"create_app():  {result['create_app_ms']:8.1f} ms")
+    if args.warm:
+        print(f"client warm:   {result['warm_ms']:8.1f} ms")
+    if result["peak_rss_mb"] is not None:
+        print(f"peak RSS:      {result['peak_rss_mb']:8.1f} MB")
+    print(f"\nImport time by package (self, top {args.top}):")
+    for package, ms in sorted(per_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:<28} {ms:8.1f} ms")
+    print("\nDeferred libraries loaded:", ", ".join(result["loaded"]) or "none")
+
+    over = []
+    if args.budget_ms is not None and startup_ms > args.budget_ms:
+        over.append(f"startup {startup_ms:.1f} ms > {args.budget_ms} ms")
+    if args.budget_mb is not None and result["peak_rss_mb"] is not None and result["peak_rss_mb"] > args.budget_mb:
+        over.append(f"peak RSS {result['peak_rss_mb']:.1f} MB > {args.budget_mb} MB")
+    if over:
+        print("\nOver budget:", "; ".join(over))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
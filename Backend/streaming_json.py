@@ -0,0 +1,69 @@
+import json
+
+
+class IncrementalObjectParser:
+    """Parses the members of a top-level JSON object as text streams in.
+
+    `feed(chunk)` returns the `(key, value)` pairs whose values became
+    complete with that chunk, so callers can act on early members before the
+    rest of the object has arrived. Anything before the opening `{` (such as
+    a ```json fence) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.members = {}
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+
+    def feed(self, chunk: str) -> list:
+        self.buffer += chunk
+        completed = []
+        while self.pos < len(self.buffer) and not self.done:
+            char = self.buffer[self.pos]
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self._depth = 1
+                    self._member_start = self.pos + 1
+                self.pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_member(self.pos, completed)
+                    self.done = True
+            elif char == "," and self._depth == 1:
+                self._finish_member(self.pos, completed)
+                self._member_start = self.pos + 1
+            self.pos += 1
+        return completed
+
+    def _finish_member(self, end: int, completed: list):
+        text = self.buffer[self._member_start:end].strip()
+        if not text:
+            return
+        # Parse `"key": value` as a one-member object
+        try:
+            (key, value), = json.loads("{" + text + "}").items()
+        except (json.JSONDecodeError, ValueError):
+            return
+        self.members[key] = value
+        completed.append((key, value))
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules import each other flat (`from limiter import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def fake_backend(tmp_path_factory):
+    """Import app against fake_services stand-ins for Supabase and Gemini.
+
+    app reads its settings at import, so this runs once per session; the
+    module is returned with its state files in a temporary directory.
+    """
+    for module in ("flask", "supabase", "google.genai", "pydantic"):
+        pytest.importorskip(module)
+    import fake_services
+
+    supabase = fake_services.serve(fake_services.FakePostgrest, "supabase", "127.0.0.1", 0, fake_services.Faults())
+    gemini = fake_services.serve(fake_services.FakeGemini, "gemini", "127.0.0.1", 0, fake_services.Faults())
+    state = tmp_path_factory.mktemp("backend")
+    os.environ.update(
+        SUPABASE_URL=f"http://127.0.0.1:{supabase.server_address[1]}",
+        SUPABASE_KEY="fake.fake.fake",
+        GEMINI_BASE_URL=f"http://127.0.0.1:{gemini.server_address[1]}",
+        GEMINI_API_KEY="fake",
+        RESUME_JOBS_DB=str(state / "resume_jobs.sqlite3"),
+    )
+    import app
+    yield app
+    supabase.shutdown()
+    gemini.shutdown()
+
+
+@pytest.fixture
+def backend(fake_backend, monkeypatch):
+    """app with empty fake tables and caches, and every bearer token
+    accepted as user "user_1"."""
+    from fake_services import FakePostgrest
+
+    FakePostgrest.tables.clear()
+    for cache in (fake_backend.upload_dedup_cache, fake_backend.match_result_cache):
+        cache.clear()
+    monkeypatch.setattr(fake_backend, "verify_clerk_token", lambda token: "user_1")
+    return fake_backend
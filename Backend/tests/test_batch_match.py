@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from limiter import Overloaded
+
+PROFILE = {"skills": [{"id": 5, "name": "Python"}], "projects": [], "experiences": []}
+MATCH = {"matched_skill_ids": [5], "matched_project_ids": [], "matched_experience_ids": [], "improved_descriptions": []}
+
+
+@pytest.fixture
+def batch(backend, monkeypatch):
+    supabase = backend.get_supabase_client()
+    for job_id in (1, 2, 4, 5):
+        supabase.table("job_descriptions").insert({"id": job_id, "profile_id": "user_1"}).execute()
+
+    async def run_match_async(profile, job_description, engine, force=False):
+        if job_description == "crash":
+            raise RuntimeError("boom")
+        if job_description == "busy":
+            raise Overloaded("gemini shedding load")
+        if job_description == "slow":
+            await asyncio.sleep(5)
+        return MATCH
+
+    monkeypatch.setattr(backend, "run_match_async", run_match_async)
+    monkeypatch.setattr(backend, "fetch_profile_from_supabase", lambda clerk_user_id: PROFILE)
+    client = backend.app.test_client()
+
+    def post(body):
+        return client.post("/match-jobs", json=body, headers={"Authorization": "Bearer token"})
+    return post, supabase
+
+
+def lines(resp) -> list:
+    return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+
+def test_each_job_gets_its_own_line(batch):
+    post, supabase = batch
+    resp = post({"jobs": [
+        {"job_id": 1, "job_description": "fine"},
+        {"job_id": 2, "job_description": "crash"},
+        {"job_id": 3, "job_description": "not mine"},
+        {"job_id": 4, "job_description": "busy"},
+    ]})
+    assert resp.status_code == 200
+    *results, done = lines(resp)
+    by_job = {line["job_id"]: line for line in results}
+    assert by_job[1] == {"job_id": 1, "matched_skill_ids": [5], "matched_project_ids": [], "matched_experience_ids": []}
+    assert by_job[2] == {"job_id": 2, "error": "Match failed"}
+    assert by_job[3] == {"job_id": 3, "error": "Job not found"}
+    assert by_job[4] == {"job_id": 4, "error": "Service overloaded, retry shortly"}
+    assert done == {"done": True, "persisted": {"job_matches": {"inserted": 1, "duplicates": 0}}}
+    matches = supabase.table("job_matches").select("*").execute().data
+    assert [(row["job_id"], row["skill_id"]) for row in matches] == [(1, 5)]
+
+
+def test_jobs_past_the_batch_timeout_are_reported(backend, batch, monkeypatch):
+    post, _ = batch
+    monkeypatch.setattr(backend, "BATCH_MATCH_TIMEOUT", 0.5)
+    *results, done = lines(post({"jobs": [
+        {"job_id": 1, "job_description": "fine"},
+        {"job_id": 5, "job_description": "slow"},
+    ]}))
+    assert {line["job_id"]: line.get("error") for line in results} == {1: None, 5: "Service overloaded, retry shortly"}
+    assert done["done"]
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"jobs": []},
+    {"jobs": [{"job_id": 1}]},
+    {"jobs": [{"job_id": 1, "job_description": "x"}], "engine": "nope"},
+])
+def test_bad_batches_are_rejected(batch, body):
+    post, _ = batch
+    assert post(body).status_code == 400
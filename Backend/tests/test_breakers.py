@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from breakers import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+class Outage(Exception):
+    pass
+
+
+def make_breaker(**kwargs):
+    defaults = {"failure_threshold": 2, "reset_timeout": 0.05}
+    defaults.update(kwargs)
+    return CircuitBreaker("test", lambda e: isinstance(e, Outage), **defaults)
+
+
+def fail(breaker, error=None):
+    breaker.before_call()
+    breaker.after_call(error or Outage("down"))
+
+
+def test_opens_after_consecutive_failures():
+    breaker = make_breaker()
+    fail(breaker)
+    assert breaker.state == CLOSED
+    fail(breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen) as info:
+        breaker.before_call()
+    assert info.value.retry_after > 0
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = make_breaker()
+    fail(breaker)
+    breaker.before_call()
+    breaker.after_call()
+    fail(breaker)
+    assert breaker.state == CLOSED
+
+
+def test_errors_that_are_not_outages_count_as_answers():
+    breaker = make_breaker()
+    for _ in range(5):
+        fail(breaker, ValueError("bad request"))
+    assert breaker.state == CLOSED
+
+
+def test_half_open_trial_success_closes():
+    breaker = make_breaker()
+    fail(breaker)
+    fail(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only one trial at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.after_call()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = make_breaker()
+    fail(breaker)
+    fail(breaker)
+    time.sleep(0.06)
+    fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.stats()["opens"] == 2
+
+
+def test_cancelled_trial_frees_the_slot():
+    breaker = make_breaker()
+    fail(breaker)
+    fail(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.cancel_call()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+PROFILE = {
+    "skills": [{"id": 1, "name": "Python"}, {"id": 2, "name": "SQL"}, {"id": 3, "name": "Go"}],
+    "projects": [{"id": 10, "name": "Job board"}],
+    "experiences": [{"id": 20, "position": "Engineer"}],
+}
+
+FINAL = {
+    "matched_skill_ids": [3],
+    "matched_project_ids": [10],
+    "matched_experience_ids": [20],
+    "improved_descriptions": [{"id": 10, "description": "Board"}, {"id": 20, "description": "Built things"}],
+}
+
+
+@pytest.fixture
+def job(backend):
+    supabase = backend.get_supabase_client()
+    supabase.table("job_descriptions").insert({"id": 7, "profile_id": "user_1"}).execute()
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        yield supabase, backend.JobMatchWriter(supabase, 7, "user_1", PROFILE, pool)
+
+
+def rows(supabase, table, column):
+    return sorted(row[column] for row in supabase.table(table).select("*").eq("job_id", 7).execute().data)
+
+
+def stream(writer, fields: dict):
+    for key, value in fields.items():
+        writer.on_field(key, value)
+    for future in list(writer.futures.values()):
+        future.result()
+
+
+def test_finish_replaces_early_rows_that_failed_validation(job):
+    supabase, writer = job
+    # Matched before this request; the reconciliation must leave it alone
+    supabase.table("job_matches").insert({"job_id": 7, "skill_id": 1}).execute()
+    stream(writer, {"matched_skill_ids": [1, 2]})
+    assert rows(supabase, "job_matches", "skill_id") == [1, 2]
+
+    result = writer.finish(FINAL)
+    assert result == {"matched_skill_ids": [3], "matched_project_ids": [10], "matched_experience_ids": [20]}
+    assert rows(supabase, "job_matches", "skill_id") == [1, 3]
+    assert rows(supabase, "project_matches", "project_id") == [10]
+    assert rows(supabase, "experience_matches", "experience_id") == [20]
+
+
+def test_finish_keeps_early_rows_that_match_the_result(job):
+    supabase, writer = job
+    stream(writer, FINAL)
+    writer.finish(FINAL)
+    assert rows(supabase, "job_matches", "skill_id") == [3]
+    assert rows(supabase, "project_matches", "project_id") == [10]
+
+
+def test_failed_match_removes_early_rows_and_ignores_late_fields(job):
+    supabase, writer = job
+    stream(writer, {"matched_skill_ids": [2]})
+    assert writer.finish({"error": "Invalid Gemini response"}) == {
+        "matched_skill_ids": [], "matched_project_ids": [], "matched_experience_ids": [],
+    }
+    # An abandoned attempt still streaming can't start new writes
+    writer.on_field("matched_experience_ids", [20])
+    writer.on_field("improved_descriptions", [])
+    assert list(writer.futures) == ["job_matches"]
+    assert rows(supabase, "job_matches", "skill_id") == []
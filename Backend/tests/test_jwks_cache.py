@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+pytest.importorskip("jwt")
+pytest.importorskip("requests")
+
+import jwt
+
+import fake_services
+from fake_services import FakeJWKS, Faults, fake_jwks, mint_token, serve
+from jwks_cache import JWKSCache
+
+
+@pytest.fixture
+def jwks_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(fake_services, "FAKE_JWKS_KEY", str(tmp_path / "key.pem"))
+    monkeypatch.setattr(FakeJWKS, "jwks", fake_jwks())
+    server = serve(FakeJWKS, "jwks", "127.0.0.1", 0, Faults())
+    yield f"http://127.0.0.1:{server.server_address[1]}/.well-known/jwks.json"
+    server.shutdown()
+
+
+def test_minted_token_verifies_against_the_fake_jwks(jwks_url):
+    token = mint_token("user_123")
+    key = JWKSCache(jwks_url).get_signing_key_from_jwt(token)
+    assert jwt.decode(token, key.key, algorithms=["RS256"])["sub"] == "user_123"
+
+
+def test_concurrent_misses_share_one_fetch(jwks_url):
+    cache = JWKSCache(jwks_url)
+    token = mint_token("user_123")
+    threads = [threading.Thread(target=cache.get_signing_key_from_jwt, args=(token,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["refreshes"] == 1
+    assert cache.stats()["keys"] == 1
+
+
+def test_unknown_kid_is_rejected(jwks_url):
+    token = jwt.encode({"sub": "x"}, "secret", algorithm="HS256", headers={"kid": "other"})
+    with pytest.raises(jwt.PyJWKClientError):
+        JWKSCache(jwks_url).get_signing_key_from_jwt(token)
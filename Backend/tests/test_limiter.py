@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+import pytest
+
+from limiter import AdaptiveLimiter, Overloaded, QueueTimeout, error_status
+
+
+class StatusError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.code = status
+
+
+def test_queue_timeout_when_full():
+    limiter = AdaptiveLimiter("test", initial=1, queue_timeout=0.05)
+    limiter.acquire()
+    with pytest.raises(QueueTimeout):
+        limiter.acquire()
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_waiter_gets_the_released_slot():
+    limiter = AdaptiveLimiter("test", initial=1, queue_timeout=2)
+    limiter.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.05)
+    limiter.release("match", 0.0)
+    waiter.join(1)
+    assert acquired.is_set()
+
+
+def test_successes_grow_the_limit():
+    limiter = AdaptiveLimiter("test", initial=2, max_limit=4)
+    for _ in range(20):
+        with limiter.slot("match"):
+            pass
+    assert limiter.limit > 2
+    assert limiter.limit <= 4
+
+
+def test_overload_halves_the_limit_once_per_round():
+    limiter = AdaptiveLimiter("test", initial=8)
+    for _ in range(2):
+        limiter.acquire()
+    started = limiter._last_decrease
+    limiter.release("match", started, StatusError(503))
+    limiter.release("match", started, StatusError(503))
+    assert limiter.limit == 4
+    assert limiter.stats()["decreases"] == 1
+    assert limiter.stats()["overloads"] == 2
+
+
+def test_slot_raises_overloaded_and_frees_the_slot():
+    limiter = AdaptiveLimiter("test", initial=2)
+    with pytest.raises(Overloaded):
+        with limiter.slot("match"):
+            raise StatusError(429)
+    assert limiter.in_flight == 0
+
+
+def test_other_errors_pass_through():
+    limiter = AdaptiveLimiter("test", initial=2)
+    with pytest.raises(ValueError):
+        with limiter.slot("match"):
+            raise ValueError("bad output")
+    assert limiter.in_flight == 0
+    assert limiter.stats()["errors"] == 1
+    assert limiter.limit == 2
+
+
+def test_cancelled_async_slot_is_abandoned():
+    limiter = AdaptiveLimiter("test", initial=2)
+
+    async def hold():
+        async with limiter.slot_async("match"):
+            await asyncio.sleep(1)
+
+    async def main():
+        task = asyncio.ensure_future(hold())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0
+    assert limiter.stats()["overloads"] == 0
+
+
+def test_error_status():
+    assert error_status(StatusError(503)) == 503
+    assert error_status(StatusError("23505")) is None
+    assert error_status(ValueError()) is None
@@ -0,0 +1,23 @@
+import time
+
+from caches import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_expiry():
+    cache = LRUCache(ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, expires_at=time.time() + 60)
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
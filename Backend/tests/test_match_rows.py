@@ -0,0 +1,22 @@
+PROFILE = {
+    "skills": [{"id": 1, "name": "Python"}, {"id": 2, "name": "SQL"}],
+    "projects": [{"id": 10, "name": "Job board"}],
+    "experiences": [],
+}
+
+
+def test_valid_matched_ids_keeps_profile_ids_only(backend):
+    # Ids come back as the profile's own values, in order, once each
+    assert backend.valid_matched_ids(["2", 99, 1, 2, None], PROFILE["skills"]) == [2, 1]
+    assert backend.valid_matched_ids(None, PROFILE["skills"]) == []
+
+
+def test_build_match_rows_drops_unknown_ids_and_attaches_descriptions(backend):
+    response = {
+        "matched_project_ids": [10, 11],
+        "improved_descriptions": [{"id": "10", "description": "Rewritten"}, {"id": 11, "description": "Invented"}],
+    }
+    spec = next(spec for spec in backend.MATCH_TABLES if spec[0] == "project_matches")
+    ids, rows = backend.build_match_rows(spec, 7, PROFILE, response)
+    assert ids == [10]
+    assert rows == [{"job_id": 7, "project_id": 10, "improved_description": "Rewritten"}]
@@ -0,0 +1,51 @@
+from offline_match import match_skills, normalize, offline_match
+
+PROFILE = {
+    "skills": [
+        {"id": 1, "name": "Python"},
+        {"id": 2, "name": "React.js"},
+        {"id": 3, "name": "Kubernetes"},
+        {"id": 4, "name": "Haskell"},
+    ],
+    "projects": [
+        {"id": 10, "name": "Job board", "description": "Flask API in Python with PostgreSQL", "link": None},
+        {"id": 11, "name": "Knitting patterns", "description": "Pattern generator for scarves", "link": None},
+    ],
+    "experiences": [
+        {"id": 20, "position": "Backend engineer", "company": "Acme", "description": "Python services on k8s"},
+    ],
+}
+
+JOB = "Backend engineer: Python, Flask and Postgres services deployed on K8s, some ReactJS."
+
+
+def test_aliases_normalize_both_sides():
+    assert normalize("ReactJS on k8s with Postgres") == ["react", "on", "kubernetes", "with", "postgresql"]
+
+
+def test_matches_skills_by_alias_and_exact_name():
+    assert offline_match(PROFILE, JOB)["matched_skill_ids"] == [1, 2, 3]
+
+
+def test_ranks_related_items_and_drops_unrelated_ones():
+    result = offline_match(PROFILE, JOB)
+    assert result["matched_project_ids"] == [10]
+    assert result["matched_experience_ids"] == [20]
+
+
+def test_response_has_the_gemini_keys():
+    result = offline_match({"skills": [], "projects": [], "experiences": []}, JOB)
+    assert result["job_raw_description"] == JOB
+    assert result["improved_descriptions"] == {}
+    assert result["matched_skill_ids"] == []
+
+
+def test_fuzzy_matches_plurals_and_typos_of_the_same_length():
+    skills = [
+        {"id": 1, "name": "Microservice"},
+        {"id": 2, "name": "Data pipeline"},
+        {"id": 3, "name": "Machine learnig"},
+        {"id": 4, "name": "Data science"},
+    ]
+    job_words = normalize("We build microservices and data pipelines for machine learning.")
+    assert match_skills(skills, job_words) == [1, 2, 3]
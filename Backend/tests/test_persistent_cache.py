@@ -0,0 +1,29 @@
+import sqlite3
+import time
+
+from caches import PersistentLRUCache
+
+
+def test_persistent_cache_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    PersistentLRUCache(path, max_entries=10).set("key", {"value": 1})
+    cache = PersistentLRUCache(path, max_entries=10)
+    assert cache.get("key") == {"value": 1}
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_persistent_cache_caps_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = PersistentLRUCache(path, max_entries=3)
+    for i in range(6):
+        cache.set(f"k{i}", i)
+    rows = sqlite3.connect(path).execute("SELECT key FROM cache_entries ORDER BY key").fetchall()
+    assert [row[0] for row in rows] == ["k3", "k4", "k5"]
+    assert cache.stats()["disk_evictions"] == 3
+
+
+def test_persistent_cache_skips_expired_rows(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    PersistentLRUCache(path, ttl=0.05).set("key", 1)
+    time.sleep(0.06)
+    assert PersistentLRUCache(path).get("key") is None
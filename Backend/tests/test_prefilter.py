@@ -0,0 +1,34 @@
+from prefilter import bm25_scores, prefilter_profile, tokenize, top_k_items
+
+
+def test_tokenize_keeps_technical_tokens():
+    assert tokenize("C++, Node.js and CI/CD.") == ["c++", "node.js", "and", "ci/cd"]
+
+
+def test_bm25_ranks_matching_documents_first():
+    scores = bm25_scores("python flask", ["python flask api", "java spring", "python scripts"])
+    assert scores[0] > scores[2] > scores[1] == 0
+
+
+def test_top_k_keeps_original_order():
+    items = [{"id": i, "name": name} for i, name in enumerate(["Java", "Python", "Go", "Flask"])]
+    assert [item["id"] for item in top_k_items(items, "Python and Flask developer", 2)] == [1, 3]
+
+
+def test_prefilter_cuts_each_category():
+    profile = {
+        "name": "A",
+        "skills": [{"id": i, "name": f"skill{i}"} for i in range(10)] + [{"id": 99, "name": "Rust"}],
+        "projects": [{"id": 1, "name": "x"}],
+        "experiences": [],
+    }
+    filtered = prefilter_profile(profile, "Rust engineer", {"skills": 1, "projects": 5, "experiences": 5})
+    assert filtered["skills"] == [{"id": 99, "name": "Rust"}]
+    assert filtered["projects"] == profile["projects"]
+    assert filtered["name"] == "A"
+    assert len(profile["skills"]) == 11
+
+
+def test_zero_keeps_everything():
+    items = [{"id": i, "name": "x"} for i in range(30)]
+    assert top_k_items(items, "y", 0) == items
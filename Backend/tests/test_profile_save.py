@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+PROFILE = {
+    "name": "Ada",
+    "email": "ada@example.com",
+    "skills": ["Python", "SQL", "Python"],
+    "education": [{"degree": "BSc", "institution": "UCL", "year": "2020"}],
+    "links": ["https://github.com/ada"],
+}
+
+
+class DuplicateKeyError(Exception):
+    code = "23505"
+
+
+class UniqueTableClient:
+    """Just enough of the Supabase client for plain inserts into a table
+    with a unique index on every column."""
+
+    def __init__(self, existing=(), error=None):
+        self.rows = [dict(row) for row in existing]
+        self.error = error
+        self.requests = 0
+
+    def table(self, name):
+        return SimpleNamespace(insert=self.insert)
+
+    def insert(self, rows):
+        rows = rows if isinstance(rows, list) else [rows]
+
+        def execute():
+            self.requests += 1
+            if self.error:
+                raise self.error
+            if any(row in self.rows for row in rows):
+                raise DuplicateKeyError("duplicate key value violates unique constraint")
+            self.rows.extend(rows)
+            return SimpleNamespace(data=rows)
+        return SimpleNamespace(execute=execute)
+
+
+def test_save_summaries_count_new_and_duplicate_rows(backend):
+    first = backend.save_profiles_to_supabase([("user_1", PROFILE)])
+    assert first["skills"] == {"inserted": 2, "duplicates": 1}
+    assert first["education"] == {"inserted": 1, "duplicates": 0}
+    assert first["links"] == {"inserted": 1, "duplicates": 0}
+
+    # Saving the same resume again adds nothing to the tables with a conflict target
+    again = backend.save_profiles_to_supabase([("user_1", PROFILE), ("user_2", {"skills": ["Go"]})])
+    assert again["skills"] == {"inserted": 1, "duplicates": 3}
+    assert again["education"] == {"inserted": 0, "duplicates": 1}
+    profiles = backend.get_supabase_client().table("user_profiles").select("*").execute().data
+    assert sorted(row["clerk_user_id"] for row in profiles) == ["user_1", "user_2"]
+
+
+def test_save_invalidates_the_profile_snapshot(backend):
+    version = backend.profile_snapshot_cache.version("user_1")
+    backend.save_profile_to_supabase(PROFILE, "user_1")
+    assert backend.profile_snapshot_cache.version("user_1") != version
+
+
+def test_duplicate_insert_falls_back_to_one_insert_per_row(backend):
+    existing = {"url": "https://github.com/ada", "profile_id": "user_1"}
+    client = UniqueTableClient(existing=[existing])
+    rows = [existing, {"url": "https://ada.dev", "profile_id": "user_1"}]
+    assert backend.bulk_insert_ignore_duplicates(client, "links", rows) == (1, 1)
+    assert client.rows == rows
+    # The bulk attempt, then one insert per row
+    assert client.requests == 3
+
+
+def test_other_insert_errors_are_raised(backend):
+    client = UniqueTableClient(error=ValueError("bad row"))
+    with pytest.raises(ValueError):
+        backend.bulk_insert_ignore_duplicates(client, "links", [{"url": "x", "profile_id": "user_1"}])
+    assert client.requests == 1
@@ -0,0 +1,168 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from breakers import CircuitBreaker, CircuitOpen
+from limiter import AdaptiveLimiter, Overloaded
+import resilience
+from resilience import AttemptTimeout, CallPolicy, is_connect_error, is_outage_error, is_transient_error
+
+
+class StatusError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.code = status
+
+
+def flaky(failures, error=StatusError(503), result="ok"):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return result
+    return fn, calls
+
+
+def test_retries_transient_errors():
+    fn, calls = flaky(2)
+    policy = CallPolicy("test", attempts=3, backoff=0)
+    assert policy.call(fn) == "ok"
+    assert len(calls) == 3
+    assert policy.stats()["retries"] == 2
+
+
+def test_gives_up_after_the_last_attempt():
+    fn, calls = flaky(5)
+    policy = CallPolicy("test", attempts=3, backoff=0)
+    with pytest.raises(StatusError):
+        policy.call(fn)
+    assert len(calls) == 3
+    assert policy.stats()["failures"] == 1
+
+
+def test_does_not_retry_client_errors():
+    fn, calls = flaky(1, error=StatusError(400))
+    policy = CallPolicy("test", attempts=3, backoff=0)
+    with pytest.raises(StatusError):
+        policy.call(fn)
+    assert len(calls) == 1
+
+
+def test_error_classification():
+    assert is_transient_error(StatusError(503))
+    assert is_transient_error(StatusError(429))
+    assert not is_transient_error(StatusError(404))
+    assert is_outage_error(StatusError(502))
+    assert not is_outage_error(StatusError(429))
+    # postgrest's APIError codes are strings, not HTTP statuses
+    assert not is_transient_error(StatusError("PGRST116"))
+
+
+def test_retry_if_limits_retries_to_connect_errors():
+    class ConnectError(Exception):
+        pass
+
+    fn, calls = flaky(1, error=ConnectError("refused"))
+    policy = CallPolicy("test", attempts=3, backoff=0, retry_if=is_connect_error)
+    assert policy.call(fn) == "ok"
+    assert len(calls) == 2
+
+    # A timed-out insert may still land, so it is not sent again
+    policy = CallPolicy("test", attempts=3, backoff=0, timeout=0.05, retry_if=is_connect_error)
+    with pytest.raises(AttemptTimeout):
+        policy.call(time.sleep, 0.2)
+    assert policy.stats()["attempts"] == 1
+
+
+def test_attempt_timeout():
+    policy = CallPolicy("test", attempts=1, timeout=0.05)
+    with pytest.raises(AttemptTimeout):
+        policy.call(time.sleep, 0.5)
+    assert policy.stats()["timeouts"] == 1
+
+
+def test_timeout_cancels_attempts_still_queued(monkeypatch):
+    monkeypatch.setattr(resilience, "_pool", concurrent.futures.ThreadPoolExecutor(max_workers=1))
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(1)
+
+    policy = CallPolicy("test", attempts=1, timeout=0.05)
+    with pytest.raises(AttemptTimeout):
+        policy.call(fn)
+    # The only pool thread is still busy, so this attempt never starts
+    with pytest.raises(AttemptTimeout):
+        policy.call(fn)
+    release.set()
+    resilience._pool.shutdown(wait=True)
+    assert len(calls) == 1
+
+
+def test_timed_out_attempt_releases_its_limiter_slot():
+    limiter = AdaptiveLimiter("test", initial=2)
+    policy = CallPolicy("test", attempts=1, timeout=0.05, limiter=limiter)
+    with pytest.raises(Overloaded):
+        policy.call(time.sleep, 0.3, slot="match")
+    stats = limiter.stats()
+    assert stats["in_flight"] == 0
+    assert stats["overloads"] == 1
+
+
+def test_hedge_wins_over_a_slow_first_attempt():
+    policy = CallPolicy("test", attempts=1, hedge_percentile=50, hedge_min_samples=5)
+    for _ in range(5):
+        policy.call(lambda: None)
+    delays = iter([0.5, 0])
+
+    def fn():
+        time.sleep(next(delays))
+        return "done"
+
+    started = time.monotonic()
+    assert policy.call(fn) == "done"
+    assert time.monotonic() - started < 0.4
+    assert policy.stats()["hedges"] == 1
+    assert policy.stats()["hedge_wins"] == 1
+
+
+def test_no_hedge_when_disabled_per_call():
+    policy = CallPolicy("test", attempts=1, hedge_percentile=50, hedge_min_samples=1)
+    policy.call(lambda: None)
+    policy.call(time.sleep, 0.05, hedge=False)
+    assert policy.stats()["hedges"] == 0
+
+
+def test_open_breaker_fails_fast():
+    breaker = CircuitBreaker("test", is_outage_error, failure_threshold=1, reset_timeout=60)
+    fn, calls = flaky(5)
+    policy = CallPolicy("test", attempts=3, backoff=0, breaker=breaker)
+    with pytest.raises(CircuitOpen):
+        policy.call(fn)
+    # The first failure opened the breaker; the retry was rejected without a call
+    assert len(calls) == 1
+
+
+def test_call_async_retries_and_times_out():
+    attempts = []
+
+    async def fn():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise StatusError(503)
+        return "ok"
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    policy = CallPolicy("test", attempts=2, backoff=0, timeout=0.05)
+    assert asyncio.run(policy.call_async(fn)) == "ok"
+    with pytest.raises(AttemptTimeout):
+        asyncio.run(policy.call_async(slow))
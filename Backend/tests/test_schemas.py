@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from pydantic import ValidationError
+
+from schemas import MatchResult, parse_model_output, repair_json
+
+
+def test_repair_strips_fences_and_trailing_commas():
+    assert repair_json('```json\n{"a": [1, 2,],}\n```') == '{"a": [1, 2]}'
+
+
+def test_repair_drops_text_around_the_object():
+    assert repair_json('Here you go: {"a": 1} Hope that helps') == '{"a": 1}'
+
+
+def test_repair_closes_a_truncated_response():
+    assert repair_json('{"a": [1, 2], "b": "unfinished') == '{"a": [1, 2], "b": "unfinished"}'
+
+
+def test_parse_valid_output_needs_no_repair():
+    result, repaired = parse_model_output('{"matched_skill_ids": [1]}', MatchResult)
+    assert result.matched_skill_ids == [1]
+    assert not repaired
+
+
+def test_parse_repairs_near_miss_output():
+    text = '```json\n{"matched_skill_ids": [1, 2,], "improved_descriptions": [{"id": "3", "description": "x"}]'
+    result, repaired = parse_model_output(text, MatchResult)
+    assert repaired
+    assert result.to_response()["improved_descriptions"] == {"3": "x"}
+
+
+def test_parse_rejects_output_that_cannot_be_repaired():
+    with pytest.raises(ValidationError):
+        parse_model_output('{"matched_skill_ids": "not a list"}', MatchResult)
@@ -0,0 +1,28 @@
+from caches import SharedVersions, VersionedSnapshotCache
+
+
+def test_snapshot_is_stale_after_a_bump():
+    cache = VersionedSnapshotCache()
+    version = cache.version("user")
+    cache.set("user", version, {"name": "A"})
+    assert cache.get("user") == {"name": "A"}
+    cache.bump("user")
+    assert cache.get("user") is None
+
+
+def test_snapshot_loaded_during_a_write_is_never_served():
+    cache = VersionedSnapshotCache()
+    version = cache.version("user")
+    cache.bump("user")
+    cache.set("user", version, {"name": "old"})
+    assert cache.get("user") is None
+
+
+def test_shared_versions_invalidate_other_caches(tmp_path):
+    path = str(tmp_path / "versions.sqlite3")
+    reader = VersionedSnapshotCache(shared_versions=SharedVersions(path))
+    writer = VersionedSnapshotCache(shared_versions=SharedVersions(path))
+    reader.set("user", reader.version("user"), {"name": "A"})
+    assert reader.get("user") == {"name": "A"}
+    writer.bump("user")
+    assert reader.get("user") is None
@@ -0,0 +1,34 @@
+import json
+
+from streaming_json import IncrementalObjectParser
+
+
+def feed_all(parser, text, size):
+    members = []
+    for i in range(0, len(text), size):
+        members.extend(parser.feed(text[i:i + size]))
+    return members
+
+
+def test_members_complete_as_they_arrive():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"matched_skill_ids": [1, 2') == []
+    assert parser.feed('], "job_title": "Dev') == [("matched_skill_ids", [1, 2])]
+    assert parser.feed('"}') == [("job_title", "Dev")]
+    assert parser.done
+
+
+def test_any_chunking_gives_the_same_members():
+    document = {
+        "matched_skill_ids": [1, 2, 3],
+        "improved_descriptions": [{"id": "4", "description": "Built {x}, [y] and \"z\""}],
+        "job_raw_description": "Line one\nLine two, with a comma",
+    }
+    text = "```json\n" + json.dumps(document) + "\n```"
+    for size in (1, 3, 7, len(text)):
+        assert dict(feed_all(IncrementalObjectParser(), text, size)) == document
+
+
+def test_text_after_the_object_is_ignored():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"a": 1} trailing {"b": 2}') == [("a", 1)]
@@ -0,0 +1,69 @@
+import hashlib
+import io
+
+import pytest
+
+from caches import PersistentLRUCache
+
+PROFILE = {"name": "Ada", "email": "ada@example.com", "skills": ["Python", "SQL"], "links": ["https://example.com"]}
+
+
+@pytest.fixture
+def uploads(backend, monkeypatch):
+    processed = []
+    saves = []
+    real_save = backend.save_profile_to_supabase
+
+    def process_resume(pdf, clerk_user_id, progress=None):
+        processed.append(pdf.read())
+        backend.save_profile_to_supabase(PROFILE, clerk_user_id)
+        return PROFILE
+
+    def save_profile(profile_data, clerk_id):
+        saves.append(clerk_id)
+        return real_save(profile_data, clerk_id)
+
+    monkeypatch.setattr(backend, "process_resume", process_resume)
+    monkeypatch.setattr(backend, "save_profile_to_supabase", save_profile)
+    client = backend.app.test_client()
+
+    def upload(pdf: bytes):
+        resp = client.post(
+            "/upload",
+            data={"resume": (io.BytesIO(pdf), "resume.pdf")},
+            headers={"Authorization": "Bearer token"},
+        )
+        assert resp.status_code == 200
+        return resp
+
+    return upload, processed, saves
+
+
+def test_duplicate_upload_skips_the_pipeline_and_the_database(uploads):
+    upload, processed, saves = uploads
+    upload(b"%PDF-1 first")
+    upload(b"%PDF-1 first")
+    assert len(processed) == 1
+    assert len(saves) == 1
+
+
+def test_duplicate_upload_is_saved_again_after_another_resume(uploads):
+    upload, processed, saves = uploads
+    upload(b"%PDF-1 first")
+    upload(b"%PDF-1 second")
+    upload(b"%PDF-1 first")
+    assert len(processed) == 2
+    assert len(saves) == 3
+    # Saved again, so a fourth upload is current once more
+    upload(b"%PDF-1 first")
+    assert len(saves) == 3
+
+
+def test_processed_uploads_are_shared_through_the_dedup_file(backend, uploads):
+    upload, _, _ = uploads
+    upload(b"%PDF-1 first")
+    # What another web worker or a resume job worker would open
+    other = PersistentLRUCache(backend.UPLOAD_DEDUP_DB)
+    entry = other.get(backend.upload_dedup_key("user_1", hashlib.sha256(b"%PDF-1 first").hexdigest()))
+    assert entry["profile"] == PROFILE
+    assert entry["version"] == backend.profile_snapshot_cache.version("user_1")